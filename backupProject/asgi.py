@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The backup progress SSE endpoint (views.backup_progress) is an async view
+streaming from Redis pub/sub. Route it to this module under an ASGI server
+(e.g. `uvicorn backupProject.asgi:application`), where an open stream is a
+coroutine waiting on Redis, not a thread. Under gunicorn's WSGI workers
+Django buffers an async stream until it ends, so progress would only arrive
+once per BACKUP_PROGRESS_STREAM_SECONDS. The rest of the app can stay on
+WSGI, e.g. with nginx sending /backup/progress/ to the ASGI server.
 """
 
 import os
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 import dj_database_url
@@ -120,17 +121,93 @@ WASABI_SECRET_KEY = os.environ.get("WASABI_SECRET_KEY")
 WASABI_BUCKET = os.environ.get("WASABI_BUCKET")
 WASABI_PREFIX = os.environ.get("WASABI_PREFIX", "")
 
+# Backup engine tuning
+# --------------------------
+BACKUP_MAX_POOL_CONNECTIONS = int(os.environ.get("BACKUP_MAX_POOL_CONNECTIONS", 64))  # floor per shared S3 client, raised to a bucket's max_concurrency x BACKUP_PART_CONCURRENCY
+BACKUP_REGION_CACHE_TTL = int(os.environ.get("BACKUP_REGION_CACHE_TTL", 24 * 60 * 60))  # seconds a bucket -> region lookup is cached
+BACKUP_LISTING_WORKERS = int(os.environ.get("BACKUP_LISTING_WORKERS", 8))  # max parallel prefix listings, 1 = serial
+BACKUP_CELERY_SHARDS = int(os.environ.get("BACKUP_CELERY_SHARDS", 1))  # shard tasks one bucket backup fans out to, 1 = single task
+BACKUP_CHECKPOINT_INTERVAL = int(os.environ.get("BACKUP_CHECKPOINT_INTERVAL", 60))  # seconds between BackupBatch checkpoints
+BACKUP_RESUME_WINDOW = int(os.environ.get("BACKUP_RESUME_WINDOW", 24 * 60 * 60))  # unfinished batches older than this start over
+BACKUP_INITIAL_CONCURRENCY = int(os.environ.get("BACKUP_INITIAL_CONCURRENCY", 10))  # starting download threads, clamped to each bucket's min/max_concurrency
+BACKUP_SMALL_OBJECT_THRESHOLD = int(os.environ.get("BACKUP_SMALL_OBJECT_THRESHOLD", 64 * 1024))  # plain GET + single write at or below this size
+BACKUP_SMALL_OBJECT_BATCH = int(os.environ.get("BACKUP_SMALL_OBJECT_BATCH", 32))  # small objects per download task
+BACKUP_LARGE_OBJECT_THRESHOLD = int(os.environ.get("BACKUP_LARGE_OBJECT_THRESHOLD", 256 * 1024 * 1024))  # ranged, resumable download at or above this size
+BACKUP_PART_SIZE = int(os.environ.get("BACKUP_PART_SIZE", 64 * 1024 * 1024))  # byte range / multipart chunk size
+BACKUP_PART_CONCURRENCY = int(os.environ.get("BACKUP_PART_CONCURRENCY", 8))  # concurrent ranges per object
+BACKUP_HASH_BUFFER = int(os.environ.get("BACKUP_HASH_BUFFER", 128 * 1024 * 1024))  # bytes per object held ahead of the in-order hash before ranges wait
+BACKUP_DELETED_RETENTION_DAYS = int(os.environ.get("BACKUP_DELETED_RETENTION_DAYS", 0))  # 0 = keep local copies of deleted objects forever, else prune them after this many days
+BACKUP_CHANGE_DETECTION = os.environ.get("BACKUP_CHANGE_DETECTION", "True") == "True"  # list-only pre-pass that skips shards unchanged since the last completed batch
+BACKUP_CONTENT_STORE = os.environ.get("BACKUP_CONTENT_STORE", "False") == "True"  # store bodies once by SHA256 under LOCAL_BACKUP_PATH/.blobs, keys are hard links
+BACKUP_BLOB_GC_GRACE = int(os.environ.get("BACKUP_BLOB_GC_GRACE", 60 * 60))  # seconds an unreferenced blob is kept before collect_blobs removes it
+BACKUP_RETRY_ATTEMPTS = int(os.environ.get("BACKUP_RETRY_ATTEMPTS", 5))  # retry_failed_files gives up on a row after this many failed downloads
+BACKUP_RETRY_BASE_DELAY = int(os.environ.get("BACKUP_RETRY_BASE_DELAY", 60))  # seconds before the first retry, doubled per attempt with jitter
+BACKUP_RETRY_MAX_DELAY = int(os.environ.get("BACKUP_RETRY_MAX_DELAY", 6 * 60 * 60))
+
+# backup_all_buckets scheduling: buckets start in priority order within these caps
+BACKUP_MAX_CONCURRENT_BUCKETS = int(os.environ.get("BACKUP_MAX_CONCURRENT_BUCKETS", 4))
+BACKUP_MAX_CONCURRENT_LARGE_BUCKETS = int(os.environ.get("BACKUP_MAX_CONCURRENT_LARGE_BUCKETS", 2))  # keep slots free for small buckets
+BACKUP_LARGE_BUCKET_SIZE = int(os.environ.get("BACKUP_LARGE_BUCKET_SIZE", 100 * 1024 ** 3))  # bytes from which a bucket counts as large
+BACKUP_LARGE_BUCKET_QUEUE = os.environ.get("BACKUP_LARGE_BUCKET_QUEUE", "celery")  # run e.g. `celery worker -Q backups_large` to separate them
+BACKUP_SMALL_BUCKET_QUEUE = os.environ.get("BACKUP_SMALL_BUCKET_QUEUE", "celery")
+BACKUP_DISPATCH_TIMEOUT = int(os.environ.get("BACKUP_DISPATCH_TIMEOUT", 2 * 60 * 60))  # a slot whose backup has not checkpointed for this long is reclaimed
+BACKUP_DISPATCH_INTERVAL = int(os.environ.get("BACKUP_DISPATCH_INTERVAL", 5 * 60))  # seconds between beat runs of dispatch_backups
+
+# Download rate limits in bytes/s and requests/s, 0 = unlimited. Global limits are
+# shared by every worker through Redis, bucket limits by each bucket's shard tasks.
+BACKUP_BANDWIDTH_LIMIT = int(os.environ.get("BACKUP_BANDWIDTH_LIMIT", 0))
+BACKUP_REQUEST_RATE_LIMIT = int(os.environ.get("BACKUP_REQUEST_RATE_LIMIT", 0))
+BACKUP_BUCKET_BANDWIDTH_LIMIT = int(os.environ.get("BACKUP_BUCKET_BANDWIDTH_LIMIT", 0))  # default for buckets without their own limit
+BACKUP_BUCKET_REQUEST_RATE_LIMIT = int(os.environ.get("BACKUP_BUCKET_REQUEST_RATE_LIMIT", 0))
+# Time-of-day overrides in TIME_ZONE, e.g. [{"start": "09:00", "end": "18:00", "global_bytes": 5000000}]
+BACKUP_RATE_LIMIT_WINDOWS = json.loads(os.environ.get("BACKUP_RATE_LIMIT_WINDOWS", "[]"))
+
+# serve_file hands the byte transfer to the front proxy: "x-accel" (nginx X-Accel-Redirect),
+# "x-sendfile" (Apache mod_xsendfile, the path is sent percent-encoded, keep XSendFileUnescape on)
+# or "" to stream from Django. For nginx, map BACKUP_FILE_OFFLOAD_PREFIX to BACKUP_FILE_OFFLOAD_ROOT
+# in an `internal` location.
+BACKUP_FILE_OFFLOAD = os.environ.get("BACKUP_FILE_OFFLOAD", "")
+BACKUP_FILE_OFFLOAD_ROOT = os.environ.get("BACKUP_FILE_OFFLOAD_ROOT", LOCAL_MIRROR_BASE)  # files outside it are streamed by Django
+BACKUP_FILE_OFFLOAD_PREFIX = os.environ.get("BACKUP_FILE_OFFLOAD_PREFIX", "/protected-backups/")
+BACKUP_ARCHIVE_READAHEAD = int(os.environ.get("BACKUP_ARCHIVE_READAHEAD", 4))  # files prefetched ahead of a streaming folder archive, 0 = off
+
+# Cache (shared by web and workers for region lookups)
+# --------------------------
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("CACHE_URL", "redis://127.0.0.1:6379/1"),
+    }
+}
+
+# Backup progress is pushed over Redis pub/sub to the SSE endpoint
+BACKUP_PROGRESS_REDIS_URL = os.environ.get("BACKUP_PROGRESS_REDIS_URL", CACHES["default"]["LOCATION"])
+BACKUP_PROGRESS_INTERVAL = float(os.environ.get("BACKUP_PROGRESS_INTERVAL", 1.0))  # min seconds between progress publishes per backup run
+# Seconds an SSE response stays open before the browser reconnects, so dropped clients don't linger
+BACKUP_PROGRESS_STREAM_SECONDS = float(os.environ.get("BACKUP_PROGRESS_STREAM_SECONDS", 300))
+
+# Redis holding the shared rate-limit token buckets, empty = limits apply per worker process
+BACKUP_RATE_LIMIT_REDIS_URL = os.environ.get("BACKUP_RATE_LIMIT_REDIS_URL", CACHES["default"]["LOCATION"])
+
 # Celery
 # --------------------------
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://127.0.0.1:6379/0")
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 60 * 60  # 1 hour max per task
-CELERY_WORKER_POOL = "solo"  # Windows compatible
+CELERY_WORKER_POOL = os.environ.get("CELERY_WORKER_POOL", "solo")  # solo is Windows compatible, use prefork to run shard tasks side by side
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Asia/Karachi"
+# Run `celery -A backupProject beat` next to the workers. dispatch_backups reclaims the slots of
+# stalled backups and starts requested buckets even when no backup ends to trigger it.
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-backups": {
+        "task": "purpleBackupApp.tasks.dispatch_backups",
+        "schedule": BACKUP_DISPATCH_INTERVAL,
+    },
+}
 
 
 # Production security for Azure
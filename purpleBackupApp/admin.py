@@ -3,7 +3,7 @@ from .models import WasabiBucket, FileBackup
 from django.utils.html import format_html
 from django.urls import reverse
 from django.contrib import messages
-from .tasks import trigger_incremental_backup
+from .tasks import start_backup
 
 
 @admin.register(WasabiBucket)
@@ -43,11 +43,14 @@ class WasabiBucketAdmin(admin.ModelAdmin):
 
     def trigger_backup_view(self, request, bucket_id):
         bucket = WasabiBucket.objects.get(pk=bucket_id)
-        result = trigger_incremental_backup.delay(bucket.id)
-        messages.success(
-            request,
-            f"Backup triggered for bucket '{bucket.name}' (task id: {result.id})"
-        )
+        result = start_backup(bucket.id)
+        if result is None:
+            messages.warning(request, f"A backup of bucket '{bucket.name}' is already running")
+        else:
+            messages.success(
+                request,
+                f"Backup triggered for bucket '{bucket.name}' (task id: {result.id})"
+            )
         return self.response_post_save_change(request, bucket)
 
 
@@ -61,5 +64,7 @@ class FileBackupAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = ("bucket", "created_at")
-    search_fields = ("wasabi_key", "bucket__name")
+    # Key search is a prefix match, so it can use the (bucket, key prefix) index. It is
+    # case-sensitive because wasabi_key has a binary collation on MySQL, like S3 keys.
+    search_fields = ("wasabi_key__startswith", "bucket__name")
     ordering = ("-created_at",)
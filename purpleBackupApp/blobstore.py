@@ -0,0 +1,108 @@
+import hashlib
+import os
+import time
+
+from django.conf import settings
+
+from .models import ContentBlob
+from .transfer import ensure_dir, in_dir
+
+HASH_CHUNK = 1024 * 1024  # bytes read at a time while hashing a download
+GC_BATCH = 500            # ContentBlob rows deleted per query
+
+# Content store: each distinct body is one file under LOCAL_BACKUP_PATH/.blobs
+# named by its SHA256, and every key's local path is a hard link to it. The
+# link count of a blob is its reference count, so deleting or replacing a
+# key's file releases it and collect_garbage removes blobs left with a single
+# link. Bucket names cannot start with a dot, so .blobs never collides.
+
+
+def blob_root():
+    return os.path.join(settings.LOCAL_BACKUP_PATH, ".blobs")
+
+
+def blob_path(sha256):
+    return os.path.join(blob_root(), sha256[:2], sha256[2:4], sha256)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def known_blobs(objs):
+    """{(etag, size): (sha256, part_size)} of stored blobs matching a batch of listed objects, one query"""
+    etags = {obj.get("ETag", "").strip('"') for obj in objs}
+    rows = ContentBlob.objects.filter(etag__in=etags).values_list("etag", "size", "sha256", "part_size")
+    return {(etag, size): (sha256, part_size) for etag, size, sha256, part_size in rows}
+
+
+def _link(src, dest):
+    """Point dest at src's inode, atomically replacing whatever dest was"""
+    tmp = dest + ".link"
+    try:
+        os.remove(tmp)
+    except FileNotFoundError:
+        pass
+    os.link(src, tmp)
+    os.replace(tmp, dest)
+
+
+def link_blob(sha256, local_path):
+    """Hard link a stored blob to a key's local path, False if the blob was collected meanwhile"""
+    try:
+        _link(blob_path(sha256), local_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def store_blob(local_path, etag, size, part_size=None, sha256=None):
+    """
+    Take a freshly downloaded, verified file into the store: it becomes the
+    blob for its hash, or is swapped for a link to the identical blob already
+    there. sha256 is the digest computed during the download, the file is
+    only read back without one. Returns the SHA256.
+    """
+    sha256 = sha256 or file_sha256(local_path)
+    path = blob_path(sha256)
+    ensure_dir(os.path.dirname(path))
+    try:
+        in_dir(path, lambda: os.link(local_path, path))
+    except FileExistsError:
+        # Same content under another key, bucket or multipart layout
+        _link(path, local_path)
+    ContentBlob.objects.bulk_create(
+        [ContentBlob(sha256=sha256, etag=etag, size=size, part_size=part_size)], ignore_conflicts=True
+    )
+    return sha256
+
+
+def collect_garbage(grace):
+    """
+    Remove blobs no key links to any more and their ContentBlob rows. Blobs
+    whose link count changed within grace seconds are kept, so a backup that
+    is linking one right now never loses it. Returns the number removed.
+    """
+    root = blob_root()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - grace
+    removed = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # st_ctime moves whenever a link is added or removed
+            if st.st_nlink == 1 and st.st_ctime < cutoff:
+                os.remove(path)
+                removed.append(name)
+    for i in range(0, len(removed), GC_BATCH):
+        ContentBlob.objects.filter(sha256__in=removed[i:i + GC_BATCH]).delete()
+    return len(removed)
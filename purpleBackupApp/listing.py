@@ -0,0 +1,218 @@
+import hashlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# A shard is {"prefix": str, "recursive": bool}. Recursive shards list every key
+# under the prefix, flat shards only the objects sitting directly in it.
+ROOT_SHARD = {"prefix": "", "recursive": True}
+
+
+def shard_key(shard):
+    """Stable string id of a shard, used to key checkpoints"""
+    return f"{'r' if shard['recursive'] else 'f'}:{shard['prefix']}"
+
+
+RANGE_SIZE = 5000  # objects per summarised key range, the unit change detection skips or diffs
+
+
+def _range_digest(objects):
+    digest = hashlib.sha256()
+    for obj in objects:
+        digest.update(f"{obj['Key']}\0{obj.get('ETag', '')}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class ShardSummary:
+    """
+    Object count, total size and a SHA256 over the (key, ETag) pairs of one
+    shard's full listing. Listings come back sorted by key, so two listings of
+    an unchanged shard give the same digest. The listing is also summarised
+    per key range, as [last key, count, digest], so the next backup can tell
+    which ranges changed while it lists them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self.ranges = []
+
+    def add(self, objects, last_key=None):
+        """Add one key range ending at last_key (its last object by default)"""
+        for obj in objects:
+            self.count += 1
+            self.size += obj["Size"]
+            self._digest.update(f"{obj['Key']}\0{obj.get('ETag', '')}\n".encode())
+        if objects:
+            last_key = last_key or objects[-1]["Key"]
+            self.ranges.append([last_key, len(objects), _range_digest(objects)])
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "size": self.size,
+            "digest": self._digest.hexdigest(),
+            "ranges": self.ranges,
+        }
+
+
+class ChangedRanges:
+    """
+    Splits a shard's listing, as it streams in, along the key ranges of the
+    previous backup's summary. Each range comes out as (objects, unchanged,
+    last_key) once the listing moves past it; a range is unchanged when its
+    count and digest match. Keys past the last known range, and ranges that
+    grew too far to hold, come out as changed chunks of RANGE_SIZE, so the
+    listing is read once and at most 2 x RANGE_SIZE objects are held.
+    """
+
+    def __init__(self, ranges=None):
+        self.ranges = ranges or []
+        self.index = 0
+        self.held = []
+        self.broken = False  # part of the current range already went out as changed
+
+    def feed(self, objects):
+        units = []
+        for obj in objects:
+            while self.index < len(self.ranges) and obj["Key"] > self.ranges[self.index][0]:
+                units.append(self._close())
+            self.held.append(obj)
+            in_range = self.index < len(self.ranges)
+            if len(self.held) >= (2 * RANGE_SIZE if in_range else RANGE_SIZE):
+                units.append((self.held, False, self.held[-1]["Key"]))
+                self.held = []
+                self.broken = in_range
+        return units
+
+    def finish(self):
+        """Units left once the listing has ended, ranges nothing was listed in included"""
+        units = []
+        while self.index < len(self.ranges):
+            units.append(self._close())
+        if self.held:
+            units.append((self.held, False, self.held[-1]["Key"]))
+            self.held = []
+        return units
+
+    def _close(self):
+        last_key, count, digest = self.ranges[self.index]
+        self.index += 1
+        held, self.held = self.held, []
+        broken, self.broken = self.broken, False
+        unchanged = not broken and len(held) == count and _range_digest(held) == digest
+        return held, unchanged, last_key
+
+
+def _common_prefixes(s3_client, bucket_name, prefix):
+    """Immediate sub-prefixes of prefix, via Delimiter='/'"""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    prefixes = []
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter="/"):
+        prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+    return prefixes
+
+
+def _split(s3_client, bucket_name, prefix, hints):
+    shards = [{"prefix": prefix, "recursive": False}]
+    for child in _common_prefixes(s3_client, bucket_name, prefix):
+        if any(hint.startswith(child) for hint in hints):
+            # Hinted prefixes are known to be large, split them one level further
+            shards.extend(_split(s3_client, bucket_name, child, hints))
+        else:
+            shards.append({"prefix": child, "recursive": True})
+    return shards
+
+
+def _prefix_hints(bucket):
+    hints = []
+    for hint in (bucket.prefix_1, bucket.prefix_2):
+        hint = (hint or "").strip("/")
+        if hint:
+            hints.append(hint + "/")
+    return hints
+
+
+def discover_shards(s3_client, bucket):
+    """
+    Split a bucket into listing shards: one per top-level prefix, with
+    bucket.prefix_1 / prefix_2 split down to their own sub-prefixes.
+    """
+    return _split(s3_client, bucket.name, "", _prefix_hints(bucket))
+
+
+def list_shard(s3_client, bucket_name, shard, **kwargs):
+    """Yield list_objects_v2 pages of a single shard"""
+    params = {"Bucket": bucket_name, "Prefix": shard["prefix"], **kwargs}
+    if not shard["recursive"]:
+        params["Delimiter"] = "/"
+    paginator = s3_client.get_paginator("list_objects_v2")
+    yield from paginator.paginate(**params)
+
+
+def iter_pages(s3_client, bucket_name, shards, max_workers, start_after=None):
+    """
+    Yield (shard, page) for every shard, listing up to max_workers shards in
+    parallel. Pages go through a bounded queue so slow consumers stall the
+    listing threads instead of buffering the whole bucket. start_after maps
+    shard keys to the key each shard resumes after.
+    """
+    start_after = start_after or {}
+
+    def _pages(shard):
+        resume = start_after.get(shard_key(shard))
+        return list_shard(s3_client, bucket_name, shard, **({"StartAfter": resume} if resume else {}))
+
+    if max_workers <= 1 or len(shards) <= 1:
+        for shard in shards:
+            for page in _pages(shard):
+                yield shard, page
+        return
+
+    pages = queue.Queue(maxsize=max_workers * 2)
+    stop = threading.Event()
+    done = object()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    remaining = [len(shards)]
+    lock = threading.Lock()
+
+    def _worker(shard):
+        try:
+            for page in _pages(shard):
+                if not _put((shard, page)):
+                    return
+        except Exception as e:
+            _put((shard, e))
+        finally:
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                _put(done)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(shards)))
+    for shard in shards:
+        executor.submit(_worker, shard)
+
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            shard, page = item
+            if isinstance(page, Exception):
+                raise page
+            yield shard, page
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from purpleBackupApp.models import WasabiBucket, FileBackup
+from purpleBackupApp.tasks import CHUNK_SIZE, _bulk_save
+
+
+def _legacy_bulk_save(records):
+    """The old insert-only path: bulk_create with ignore_conflicts"""
+    objs = [
+        FileBackup(
+            bucket=r["bucket"],
+            wasabi_key=r["wasabi_key"],
+            etag=r["etag"],
+            last_modified=r["last_modified"],
+            size=r["size"],
+            local_path=r["local_path"],
+            status=r["status"],
+            batch_id=0,
+        )
+        for r in records
+    ]
+    FileBackup.objects.bulk_create(objs, ignore_conflicts=True)
+
+
+class Command(BaseCommand):
+    help = "Compare rows/second of the legacy insert-only save and the upsert in _bulk_save"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20000, help="Rows written per run")
+
+    def _records(self, bucket, rows, generation):
+        modified = timezone.now() - timedelta(days=1)
+        return [
+            {
+                "bucket": bucket,
+                "wasabi_key": f"bench/{i // 1000:05d}/object-{i:08d}.bin",
+                "etag": f"{generation:08x}{i:024x}",
+                "last_modified": modified,
+                "size": i,
+                "local_path": f"/tmp/bench/object-{i:08d}.bin",
+                "status": "synced",
+            }
+            for i in range(rows)
+        ]
+
+    def _run(self, label, save, records):
+        start = time.perf_counter()
+        for i in range(0, len(records), CHUNK_SIZE):
+            save(records[i:i + CHUNK_SIZE])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<32} {len(records) / elapsed:>12,.0f} rows/s ({elapsed:.2f}s)")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        legacy_bucket = WasabiBucket.objects.create(name="__bench_bulk_save_legacy__")
+        upsert_bucket = WasabiBucket.objects.create(name="__bench_bulk_save_upsert__")
+        try:
+            self._run("legacy insert (new rows)", _legacy_bulk_save, self._records(legacy_bucket, rows, 1))
+            self._run("upsert insert (new rows)", _bulk_save, self._records(upsert_bucket, rows, 1))
+            self._run("legacy re-save (changed etag)", _legacy_bulk_save, self._records(legacy_bucket, rows, 2))
+            self._run("upsert re-save (changed etag)", _bulk_save, self._records(upsert_bucket, rows, 2))
+
+            stale = FileBackup.objects.filter(bucket=legacy_bucket, etag__startswith=f"{1:08x}").count()
+            fresh = FileBackup.objects.filter(bucket=upsert_bucket, etag__startswith=f"{2:08x}").count()
+            self.stdout.write(f"rows left stale by legacy path: {stale}/{rows}")
+            self.stdout.write(f"rows updated by upsert path:    {fresh}/{rows}")
+        finally:
+            legacy_bucket.delete()
+            upsert_bucket.delete()
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished"))
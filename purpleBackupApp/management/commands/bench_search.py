@@ -0,0 +1,102 @@
+import os
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from purpleBackupApp.models import WasabiBucket, FileBackup
+from purpleBackupApp.search import search_files
+
+BENCH_BUCKET = "__bench_search__"
+WORDS = [
+    "invoice", "report", "backup", "photo", "scan", "contract", "draft", "final",
+    "summary", "export", "archive", "budget", "meeting", "notes", "design", "log",
+]
+EXTENSIONS = ["pdf", "jpg", "png", "docx", "xlsx", "csv", "txt", "zip", "mp4", "json"]
+PAGE = 50
+
+
+class Command(BaseCommand):
+    help = "Compare the filename search index against the old icontains query on a synthetic fixture"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, required=True, help="Fixture rows, e.g. 10000000")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per insert")
+        parser.add_argument("--keep", action="store_true", help="Keep the fixture for the next run")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query, the best time is reported")
+
+    def _populate(self, bucket, rows, chunk_size):
+        rng = random.Random(42)
+        now = timezone.now()
+        for start in range(0, rows, chunk_size):
+            objs = []
+            for i in range(start, min(rows, start + chunk_size)):
+                key = (
+                    f"{rng.choice(WORDS)}/{i // 10000:04d}/"
+                    f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}.{rng.choice(EXTENSIONS)}"
+                )
+                objs.append(FileBackup(
+                    bucket=bucket, wasabi_key=key, etag="0" * 32, last_modified=now,
+                    size=i, local_path=key, status="synced", batch_id=0,
+                    **FileBackup.derived_fields(key),
+                ))
+            FileBackup.objects.bulk_create(objs)
+            self.stdout.write(f"\r  {min(rows, start + chunk_size):,}/{rows:,} rows", ending="")
+        self.stdout.write("")
+
+    def _time(self, fn, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        # The fixture is millions of rows written next to real data, keep it off production
+        name = str(connection.settings_dict["NAME"])
+        if not os.path.basename(name).startswith("test"):
+            raise CommandError(
+                f"Refusing to build a fixture in database {name!r}, point DATABASE_URL at a database named test*"
+            )
+        rows = options["rows"]
+        bucket, created = WasabiBucket.objects.get_or_create(name=BENCH_BUCKET)
+        if created or FileBackup.objects.filter(bucket=bucket).count() != rows:
+            FileBackup.objects.filter(bucket=bucket).delete()
+            self.stdout.write(f"Building a {rows:,}-row fixture...")
+            self._populate(bucket, rows, options["chunk_size"])
+
+        queries = [
+            ("substring", "voice_rep", {}),
+            ("substring", "_12345", {}),
+            ("prefix", "budget_*", {}),
+            ("extension", "final ext:csv", {}),
+        ]
+        try:
+            for label, q, extra in queries:
+                term = q.split()[0].rstrip("*")
+
+                def _legacy():
+                    files = FileBackup.objects.filter(
+                        Q(wasabi_key__icontains=term) | Q(bucket__name__icontains=term)
+                    )
+                    return list(files.order_by("wasabi_key", "id")[:PAGE])
+
+                def _indexed():
+                    files = search_files(q, **extra)
+                    return list(files.order_by("-rank", "wasabi_key", "id")[:PAGE])
+
+                legacy_time, legacy_rows = self._time(_legacy, options["repeat"])
+                indexed_time, indexed_rows = self._time(_indexed, options["repeat"])
+                self.stdout.write(
+                    f"{label:<10} {q!r:<18} icontains {legacy_time * 1000:>9.1f} ms ({len(legacy_rows)} rows)"
+                    f"   index {indexed_time * 1000:>9.1f} ms ({len(indexed_rows)} rows)"
+                )
+        finally:
+            if not options["keep"]:
+                bucket.delete()
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished"))
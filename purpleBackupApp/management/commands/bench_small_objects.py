@@ -0,0 +1,94 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from purpleBackupApp.transfer import download_small, ensure_dir
+
+BENCH_BUCKET = "bench-small-objects"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark objects/second of the small-object lane against download_file "
+        "on a synthetic bucket served by a local moto S3 server (pip install 'moto[server]')"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--objects", type=int, default=100000, help="Objects in the synthetic bucket")
+        parser.add_argument("--size", type=int, default=4096, help="Bytes per object")
+        parser.add_argument("--threads", type=int, default=settings.BACKUP_INITIAL_CONCURRENCY, help="Download threads")
+        parser.add_argument("--port", type=int, default=5055, help="Port for the moto server")
+
+    def _client(self, endpoint, threads):
+        return boto3.client(
+            "s3",
+            endpoint_url=endpoint,
+            region_name="us-east-1",
+            aws_access_key_id="bench",
+            aws_secret_access_key="bench",
+            config=Config(max_pool_connections=threads * 2),
+        )
+
+    def _populate(self, s3_client, count, size, threads):
+        payload = os.urandom(size)
+        s3_client.create_bucket(Bucket=BENCH_BUCKET)
+
+        def _put(i):
+            # 100 keys per directory, like a typical folder layout
+            s3_client.put_object(Bucket=BENCH_BUCKET, Key=f"dir{i // 100:05d}/obj{i:07d}", Body=payload)
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(_put, range(count)))
+
+    def _keys(self, s3_client):
+        paginator = s3_client.get_paginator("list_objects_v2")
+        return [obj["Key"] for page in paginator.paginate(Bucket=BENCH_BUCKET) for obj in page.get("Contents", [])]
+
+    def _run(self, label, fetch, keys, threads):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(fetch, keys))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<28} {len(keys) / elapsed:>10,.0f} objects/s ({elapsed:.2f}s)")
+
+    def handle(self, *args, **options):
+        try:
+            from moto.server import ThreadedMotoServer
+        except ImportError:
+            raise CommandError("moto is not installed, run: pip install 'moto[server]'")
+
+        threads = options["threads"]
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)  # moto logs every request
+        server = ThreadedMotoServer(port=options["port"], verbose=False)
+        server.start()
+        workdir = tempfile.mkdtemp(prefix="bench_small_objects_")
+        try:
+            s3_client = self._client(f"http://127.0.0.1:{options['port']}", threads)
+            self.stdout.write(f"Uploading {options['objects']:,} objects of {options['size']} bytes...")
+            self._populate(s3_client, options["objects"], options["size"], threads)
+            keys = self._keys(s3_client)
+
+            def _legacy(key):
+                local_path = os.path.join(workdir, "legacy", key)
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                s3_client.download_file(BENCH_BUCKET, key, local_path)
+
+            def _small(key):
+                local_path = os.path.join(workdir, "small", key)
+                ensure_dir(os.path.dirname(local_path))
+                download_small(s3_client, BENCH_BUCKET, key, local_path)
+
+            self._run("download_file", _legacy, keys, threads)
+            self._run("small-object lane", _small, keys, threads)
+        finally:
+            server.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished"))
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from purpleBackupApp.models import FileBackup, BackupFolder
+
+SAMPLE_HASH = "0" * 64
+
+
+def _plans():
+    """(label, queryset, index name fragments any of which must appear in the plan, vendors or None)"""
+    files = FileBackup.objects.filter(bucket_id=1)
+    return [
+        (
+            "folder listing",
+            files.filter(folder_hash=SAMPLE_HASH).order_by("basename", "id")[:201],
+            ["filebackup_folder_name_idx"],
+            None,
+        ),
+        (
+            "child folders",
+            BackupFolder.objects.filter(bucket_id=1, parent_hash=SAMPLE_HASH).order_by("name", "id")[:201],
+            ["backupfolder_parent_idx"],
+            None,
+        ),
+        (
+            "key prefix",
+            files.filter(wasabi_key__startswith="photos/2024/"),
+            ["filebackup_key_prefix_idx"],
+            ["mysql"],
+        ),
+        (
+            "key hash lookup",
+            files.filter(wasabi_key_hash__in=[SAMPLE_HASH, "1" * 64]),
+            # Django names the unique_together index after its columns, SQLite keeps it as an autoindex
+            ["wasabi_key_hash", "sqlite_autoindex"],
+            None,
+        ),
+        (
+            "status filter",
+            files.filter(status="failed"),
+            ["filebackup_status_idx"],
+            None,
+        ),
+        (
+            "admin ordering",
+            FileBackup.objects.order_by("-created_at")[:100],
+            ["filebackup_created_idx"],
+            None,
+        ),
+        (
+            "extension filter",
+            FileBackup.objects.filter(extension="pdf").order_by("basename")[:50],
+            ["filebackup_extension_idx"],
+            None,
+        ),
+    ]
+
+
+def explain(queryset):
+    if connection.vendor == "mysql":
+        return queryset.explain(format="json")
+    return queryset.explain()
+
+
+def full_scan(plan):
+    return '"access_type": "ALL"' in plan
+
+
+def uses_index(plan, indexes):
+    return any(index in plan for index in indexes)
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the FileBackup/BackupFolder queries the app depends on and fail if any "
+        "stops using its index. Run against a database with realistic row counts, "
+        "optimizers may prefer a scan on near-empty tables. QueryPlanTests run the "
+        "same checks on MySQL as part of the test suite."
+    )
+
+    def handle(self, *args, **options):
+        failures = []
+        for label, queryset, indexes, vendors in _plans():
+            if vendors and connection.vendor not in vendors:
+                self.stdout.write(f"⏭️  {label}: skipped on {connection.vendor}")
+                continue
+            plan = explain(queryset)
+            if full_scan(plan) or not uses_index(plan, indexes):
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"❌ {label}: expected {' or '.join(indexes)}"))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(f"✅ {label}")
+
+        if failures:
+            raise CommandError(f"Query plan regressions: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("✅ All query plans use their indexes"))
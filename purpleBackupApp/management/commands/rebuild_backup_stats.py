@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from purpleBackupApp.models import WasabiBucket, FileBackup, BackupFolder
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute WasabiBucket totals and BackupFolder stats from the FileBackup rows, "
+        "filling in FileBackup folder and search columns where they are missing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bucket", help="Only rebuild this bucket (by name)")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows fetched per query")
+
+    def backfill_derived_fields(self, bucket, chunk_size):
+        """Fill folder_hash / basename / extension on rows saved before those columns existed"""
+        fields = list(FileBackup.derived_fields("").keys())
+        filled = 0
+        while True:
+            rows = list(
+                FileBackup.objects.filter(bucket=bucket)
+                .filter(Q(folder_hash__isnull=True) | Q(basename__isnull=True))
+                .only("id", "wasabi_key")[:chunk_size]
+            )
+            if not rows:
+                return filled
+            for row in rows:
+                for field, value in FileBackup.derived_fields(row.wasabi_key).items():
+                    setattr(row, field, value)
+            FileBackup.objects.bulk_update(rows, fields)
+            filled += len(rows)
+
+    def rebuild(self, bucket, chunk_size):
+        # Memory grows with the number of folders, not the number of files
+        folders = {}
+        rows = (
+            FileBackup.objects.filter(bucket=bucket)
+            .exclude(status="deleted")
+            .values_list("wasabi_key", "size")
+            .iterator(chunk_size=chunk_size)
+        )
+        for key, size in rows:
+            for path in BackupFolder.ancestors(key):
+                stats = folders.setdefault(path, [0, 0])
+                stats[0] += 1
+                stats[1] += size
+
+        total_files, total_size = folders.get("", (0, 0))
+        with transaction.atomic():
+            BackupFolder.objects.filter(bucket=bucket).delete()
+            BackupFolder.objects.bulk_create(
+                [
+                    BackupFolder.build(bucket, path, total_files=files, total_size=size)
+                    for path, (files, size) in folders.items()
+                ],
+                batch_size=chunk_size,
+            )
+            WasabiBucket.objects.filter(id=bucket.id).update(total_files=total_files, total_size=total_size)
+        return total_files, total_size, len(folders)
+
+    def handle(self, *args, **options):
+        buckets = WasabiBucket.objects.all()
+        if options["bucket"]:
+            buckets = buckets.filter(name=options["bucket"])
+            if not buckets.exists():
+                raise CommandError(f"Bucket {options['bucket']} does not exist")
+
+        for bucket in buckets:
+            filled = self.backfill_derived_fields(bucket, options["chunk_size"])
+            if filled:
+                self.stdout.write(f"{bucket.name}: filled index columns on {filled} rows")
+            files, size, folders = self.rebuild(bucket, options["chunk_size"])
+            self.stdout.write(f"{bucket.name}: {files} files, {size} bytes in {folders} folders")
+        self.stdout.write(self.style.SUCCESS("✅ Stats rebuilt"))
@@ -0,0 +1,94 @@
+import os
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from purpleBackupApp.models import WasabiBucket, FileBackup
+from purpleBackupApp.tasks import _schedule_retry
+from purpleBackupApp.transfer import file_etag
+
+
+def _lower_priority(nice):
+    # Scrubbing yields CPU and, on Linux CFQ/BFQ, disk time to the web workers
+    if hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def _verify(row):
+    """(id, problem) for one file, problem is None when its bytes still match local_etag"""
+    row_id, local_path, local_etag, part_size, rate = row
+    try:
+        actual = file_etag(local_path, part_size, rate)
+    except FileNotFoundError:
+        return row_id, "missing"
+    except OSError as e:
+        return row_id, f"unreadable: {e}"
+    return row_id, None if actual == local_etag else f"mismatch: {actual}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-verify local copies against the ETag recorded when they were downloaded, "
+        "marking files that are missing or no longer match as pending for retry_failed_files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bucket", help="Only scrub this bucket (by name)")
+        parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Hashing processes")
+        parser.add_argument("--max-rate", type=float, default=50, help="Total read rate in MB/s, 0 = unlimited")
+        parser.add_argument("--nice", type=int, default=10, help="Niceness added to the hashing processes")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched per query")
+
+    def handle(self, *args, **options):
+        rows = FileBackup.objects.filter(status="synced", local_etag__isnull=False)
+        if options["bucket"]:
+            bucket = WasabiBucket.objects.filter(name=options["bucket"]).first()
+            if bucket is None:
+                raise CommandError(f"Bucket {options['bucket']} does not exist")
+            rows = rows.filter(bucket=bucket)
+
+        workers = max(1, options["workers"])
+        # Each process gets an equal share of the total rate
+        rate = int(options["max_rate"] * 1024 * 1024 / workers)
+        chunk_size = options["chunk_size"]
+
+        checked = flagged = scrubbed = 0
+        flagged_buckets = set()
+        started = time.monotonic()
+        connections.close_all()  # forked workers must not share the parent's DB sockets
+        with Pool(workers, initializer=_lower_priority, initargs=(options["nice"],)) as pool:
+            after = 0
+            while True:
+                chunk = list(
+                    rows.filter(id__gt=after)
+                    .order_by("id")
+                    .values_list("id", "local_path", "local_etag", "part_size", "size", "bucket_id")[:chunk_size]
+                )
+                if not chunk:
+                    break
+                after = chunk[-1][0]
+                buckets = {r[0]: r[5] for r in chunk}
+                bad = []
+                for row_id, problem in pool.imap_unordered(
+                    _verify, [(r[0], r[1], r[2], r[3], rate) for r in chunk]
+                ):
+                    if problem:
+                        bad.append(FileBackup(id=row_id, status="pending", error=f"scrub: {problem}"[:255], attempts=0))
+                        flagged_buckets.add(buckets[row_id])
+                        self.stderr.write(f"❌ FileBackup {row_id}: {problem}")
+                if bad:
+                    FileBackup.objects.bulk_update(bad, ["status", "error", "attempts"])
+                checked += len(chunk)
+                flagged += len(bad)
+                scrubbed += sum(r[4] for r in chunk)
+
+        for bucket_id in flagged_buckets:
+            _schedule_retry(bucket_id, 1)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Scrubbed {checked} files ({scrubbed / 1024 / 1024:.0f} MB) in {elapsed:.0f}s, {flagged} queued for download"
+        )
+        self.stdout.write(self.style.SUCCESS("✅ Scrub finished"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0005_remove_wasabibucket_region'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filebackup',
+            name='wasabi_key_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
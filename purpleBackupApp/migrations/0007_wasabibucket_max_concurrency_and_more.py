@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0006_alter_filebackup_wasabi_key_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasabibucket',
+            name='max_concurrency',
+            field=models.PositiveIntegerField(default=32),
+        ),
+        migrations.AddField(
+            model_name='wasabibucket',
+            name='min_concurrency',
+            field=models.PositiveIntegerField(default=2),
+        ),
+    ]
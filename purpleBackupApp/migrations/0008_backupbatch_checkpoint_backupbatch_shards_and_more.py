@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0007_wasabibucket_max_concurrency_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupbatch',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='backupbatch',
+            name='shards',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='backupbatch',
+            name='total_objects',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='backupbatch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0008_backupbatch_checkpoint_backupbatch_shards_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasabibucket',
+            name='region',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
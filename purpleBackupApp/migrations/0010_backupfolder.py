@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0009_wasabibucket_region'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupFolder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(blank=True, max_length=1024)),
+                ('path_hash', models.CharField(max_length=64)),
+                ('total_files', models.BigIntegerField(default=0)),
+                ('total_size', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bucket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='folders', to='purpleBackupApp.wasabibucket')),
+            ],
+            options={
+                'unique_together': {('bucket', 'path_hash')},
+            },
+        ),
+    ]
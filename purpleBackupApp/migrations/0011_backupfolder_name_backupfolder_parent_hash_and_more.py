@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0010_backupfolder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupfolder',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='backupfolder',
+            name='parent_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='filebackup',
+            name='folder_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='backupfolder',
+            index=models.Index(fields=['bucket', 'parent_hash', 'name'], name='backupfolder_parent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filebackup',
+            index=models.Index(fields=['bucket', 'folder_hash', 'wasabi_key'], name='filebackup_folder_idx'),
+        ),
+    ]
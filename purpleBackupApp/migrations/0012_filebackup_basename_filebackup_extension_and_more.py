@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:58
+
+from django.db import migrations, models
+
+
+def add_fulltext_index(apps, schema_editor):
+    # FULLTEXT ... WITH PARSER ngram is MySQL only, other backends fall back to LIKE scans
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = apps.get_model('purpleBackupApp', 'FileBackup')._meta.db_table
+    schema_editor.execute(
+        f"ALTER TABLE `{table}` ADD FULLTEXT INDEX filebackup_basename_ft (basename) WITH PARSER ngram"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = apps.get_model('purpleBackupApp', 'FileBackup')._meta.db_table
+    schema_editor.execute(f"ALTER TABLE `{table}` DROP INDEX filebackup_basename_ft")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0011_backupfolder_name_backupfolder_parent_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filebackup',
+            name='basename',
+            field=models.CharField(blank=True, max_length=191, null=True),
+        ),
+        migrations.AddField(
+            model_name='filebackup',
+            name='extension',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='filebackup',
+            index=models.Index(fields=['basename'], name='filebackup_basename_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filebackup',
+            index=models.Index(fields=['extension', 'basename'], name='filebackup_extension_idx'),
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:00
+
+import hashlib
+
+import purpleBackupApp.models
+from django.db import migrations, models
+
+BACKFILL_CHUNK = 5000
+
+
+def backfill_key_hashes(apps, schema_editor):
+    # Rows written by bulk_create before the hash was derived there have no hash yet.
+    # Walk the primary key in chunks so each UPDATE stays small on a large table.
+    FileBackup = apps.get_model('purpleBackupApp', 'FileBackup')
+    last_id = 0
+    while True:
+        rows = list(
+            FileBackup.objects.filter(id__gt=last_id, wasabi_key_hash__isnull=True)
+            .order_by('id').only('id', 'wasabi_key')[:BACKFILL_CHUNK]
+        )
+        if not rows:
+            return
+        for row in rows:
+            row.wasabi_key_hash = hashlib.sha256(row.wasabi_key.encode('utf-8')).hexdigest()
+        FileBackup.objects.bulk_update(rows, ['wasabi_key_hash'])
+        last_id = rows[-1].id
+
+
+def add_key_prefix_index(apps, schema_editor):
+    # Prefix lengths are MySQL only; 255 utf8mb4 characters stay under InnoDB's 3072-byte key limit.
+    # INPLACE/LOCK=NONE keeps the table writable while the index builds.
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = apps.get_model('purpleBackupApp', 'FileBackup')._meta.db_table
+    schema_editor.execute(
+        f"ALTER TABLE `{table}` ADD INDEX filebackup_key_prefix_idx (bucket_id, wasabi_key(255)), "
+        "ALGORITHM=INPLACE, LOCK=NONE"
+    )
+
+
+def drop_key_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = apps.get_model('purpleBackupApp', 'FileBackup')._meta.db_table
+    schema_editor.execute(f"ALTER TABLE `{table}` DROP INDEX filebackup_key_prefix_idx")
+
+
+class Migration(migrations.Migration):
+    # Commit the hash backfill chunk by chunk instead of holding one long transaction.
+    #
+    # OFFLINE MIGRATION on MySQL: widening wasabi_key to varchar(1024) with a new
+    # collation is ALGORITHM=COPY. The whole filebackup table is rebuilt and writes
+    # block until it finishes. Stop the Celery workers and beat before migrating, or
+    # on very large tables apply the `sqlmigrate purpleBackupApp 0013` statements with
+    # an online schema change tool (gh-ost, pt-online-schema-change) and then
+    # `migrate --fake purpleBackupApp 0013`. Only the prefix index at the end is online.
+    atomic = False
+
+    dependencies = [
+        ('purpleBackupApp', '0012_filebackup_basename_filebackup_extension_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_key_hashes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='filebackup',
+            name='filebackup_folder_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='filebackup',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='backupfolder',
+            name='path',
+            field=purpleBackupApp.models.KeyField(blank=True, max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name='filebackup',
+            name='wasabi_key',
+            field=purpleBackupApp.models.KeyField(max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name='filebackup',
+            name='wasabi_key_hash',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AlterUniqueTogether(
+            name='filebackup',
+            unique_together={('bucket', 'wasabi_key_hash')},
+        ),
+        migrations.AddIndex(
+            model_name='filebackup',
+            index=models.Index(fields=['bucket', 'folder_hash', 'basename'], name='filebackup_folder_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filebackup',
+            index=models.Index(fields=['bucket', 'status'], name='filebackup_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filebackup',
+            index=models.Index(fields=['created_at'], name='filebackup_created_idx'),
+        ),
+        migrations.RunPython(add_key_prefix_index, drop_key_prefix_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:03
+
+import purpleBackupApp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0013_filebackup_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupbatch',
+            name='deleted_files',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='filebackup',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='filebackup',
+            name='local_path',
+            field=purpleBackupApp.models.KeyField(max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name='filebackup',
+            name='status',
+            field=models.CharField(choices=[('synced', 'Synced'), ('pending', 'Pending'), ('failed', 'Failed'), ('deleted', 'Deleted')], default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0014_filebackup_deleted_at_backupbatch_deleted_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupbatch',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
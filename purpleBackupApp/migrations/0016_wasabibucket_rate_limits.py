@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0015_backupbatch_cancelled_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasabibucket',
+            name='bandwidth_limit',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wasabibucket',
+            name='request_rate_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0016_wasabibucket_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasabibucket',
+            name='backup_queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wasabibucket',
+            name='backup_requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
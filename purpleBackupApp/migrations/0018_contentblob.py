@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0017_wasabibucket_backup_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('etag', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['etag', 'size'], name='contentblob_etag_idx')],
+                'unique_together': {('sha256', 'etag')},
+            },
+        ),
+    ]
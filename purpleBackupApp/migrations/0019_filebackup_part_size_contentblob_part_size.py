@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0018_contentblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filebackup',
+            name='part_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='contentblob',
+            name='part_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
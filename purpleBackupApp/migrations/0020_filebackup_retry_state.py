@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purpleBackupApp', '0019_filebackup_part_size_contentblob_part_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filebackup',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='filebackup',
+            name='error',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='filebackup',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:00
+
+import hashlib
+import os
+
+from django.db import migrations
+from django.db.models import Q
+
+BACKFILL_CHUNK = 5000
+
+
+def backfill_derived_fields(apps, schema_editor):
+    # Rows saved before 0011/0012 have no folder_hash, basename or extension, so
+    # bucket_detail, search and the deleted-folder sweep can't see them.
+    # Same derivation as FileBackup.derived_fields, inlined because historical
+    # models have no custom methods. Keyset chunks keep each UPDATE small.
+    FileBackup = apps.get_model('purpleBackupApp', 'FileBackup')
+    last_id = 0
+    while True:
+        rows = list(
+            FileBackup.objects.filter(id__gt=last_id)
+            .filter(Q(folder_hash__isnull=True) | Q(basename__isnull=True))
+            .order_by('id').only('id', 'wasabi_key')[:BACKFILL_CHUNK]
+        )
+        if not rows:
+            return
+        for row in rows:
+            folder, _, basename = row.wasabi_key.rpartition('/')
+            row.folder_hash = hashlib.sha256(folder.encode()).hexdigest()
+            row.basename = basename[:191]
+            row.extension = os.path.splitext(basename)[1][1:].lower()[:16]
+        FileBackup.objects.bulk_update(rows, ['folder_hash', 'basename', 'extension'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+    # Commit the backfill chunk by chunk instead of holding one long transaction
+    atomic = False
+
+    dependencies = [
+        ('purpleBackupApp', '0020_filebackup_retry_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_derived_fields, migrations.RunPython.noop),
+    ]
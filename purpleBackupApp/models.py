@@ -1,10 +1,27 @@
 from django.db import models
 import hashlib
+import os
+
+
+class KeyField(models.CharField):
+    """
+    Object key column. On MySQL it keeps its full max_length, outside the
+    settings-wide varchar(191) patch, and uses a binary collation so keys
+    compare and sort byte-wise like list_objects_v2 returns them.
+    """
+
+    def db_type(self, connection):
+        if connection.vendor == 'mysql':
+            return f'varchar({self.max_length}) COLLATE utf8mb4_bin'
+        return super().db_type(connection)
+
+
 class WasabiBucket(models.Model):
     name = models.CharField(max_length=191, unique=True)  # actual bucket name
     display_name = models.CharField(max_length=255, blank=True, null=True)  # optional human-friendly name
     prefix_1 = models.CharField(max_length=255, blank=True, null=True)
     prefix_2 = models.CharField(max_length=255, blank=True, null=True)
+    region = models.CharField(max_length=32, blank=True, null=True)  # last known Wasabi region
     
     
     # Backup tracking
@@ -12,6 +29,15 @@ class WasabiBucket(models.Model):
     last_backup_at = models.DateTimeField(blank=True, null=True)
     successful_backups = models.PositiveIntegerField(default=0)
     failed_backups = models.PositiveIntegerField(default=0)
+    backup_requested_at = models.DateTimeField(blank=True, null=True)  # waiting for a slot in the backup_all_buckets scheduler
+    backup_queued_at = models.DateTimeField(blank=True, null=True)  # holds a scheduler slot since, cleared when the backup ends
+
+    # Download concurrency bounds for the adaptive controller
+    min_concurrency = models.PositiveIntegerField(default=2)
+    max_concurrency = models.PositiveIntegerField(default=32)
+    # Download caps for this bucket, None = BACKUP_BUCKET_BANDWIDTH_LIMIT / BACKUP_BUCKET_REQUEST_RATE_LIMIT, 0 = unlimited
+    bandwidth_limit = models.PositiveBigIntegerField(blank=True, null=True)  # bytes per second
+    request_rate_limit = models.PositiveIntegerField(blank=True, null=True)  # GET requests per second
 
     # Stats (precomputed)
     total_files = models.PositiveBigIntegerField(default=0)
@@ -27,14 +53,15 @@ class WasabiBucket(models.Model):
 class FileBackup(models.Model):
     STATUS_CHOICES = [
         ('synced', 'Synced'),
-        ('pending', 'Pending'),
-        ('failed', 'Failed'),
+        ('pending', 'Pending'),  # local copy must be fetched again, e.g. flagged by scrub_backups
+        ('failed', 'Failed'),  # download failed, retried by retry_failed_files with backoff
+        ('deleted', 'Deleted'),  # gone from Wasabi, local copy kept until the retention period ends
     ]
 
     # Wasabi details
     bucket = models.ForeignKey(WasabiBucket, on_delete=models.CASCADE, related_name='files')
-    wasabi_key = models.CharField(max_length=1024,db_index=False)  # full path in bucket
-    wasabi_key_hash=models.CharField(max_length=64, unique=True, null=True, blank=True)  # SHA256 hash of wasabi_key for indexing
+    wasabi_key = KeyField(max_length=1024)  # full path in bucket, indexed by a (bucket, key prefix) index
+    wasabi_key_hash = models.CharField(max_length=64)  # SHA256 hash of wasabi_key, unique per bucket
     etag = models.CharField(max_length=64)  # checksum from Wasabi
     last_modified = models.DateTimeField()  # last modified on Wasabi
     size = models.BigIntegerField()  # file size in bytes
@@ -46,24 +73,68 @@ class FileBackup(models.Model):
         return self.wasabi_key.split('/')[-1]
 
     # Local system details
-    local_path = models.CharField(max_length=1024)
-    local_etag = models.CharField(max_length=64, blank=True, null=True)
+    local_path = KeyField(max_length=1024)
+    local_etag = models.CharField(max_length=64, blank=True, null=True)  # ETag recomputed from the downloaded bytes, null if unverifiable
+    part_size = models.BigIntegerField(blank=True, null=True)  # part size local_etag was computed with, null for a plain MD5
     last_synced = models.DateTimeField(blank=True, null=True)
 
+    # SHA256 of the containing folder path (BackupFolder.path_hash), for one-level listings
+    folder_hash = models.CharField(max_length=64, blank=True, null=True)
+
+    # Filename search columns, basename also carries a FULLTEXT ngram index on MySQL
+    basename = models.CharField(max_length=191, blank=True, null=True)
+    extension = models.CharField(max_length=16, blank=True, null=True)  # lower case, without the dot
+
     # Backup metadata
     batch_id = models.PositiveIntegerField()  # batch counter for incremental backups
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    deleted_at = models.DateTimeField(blank=True, null=True)  # when a backup found the object gone
+    error = models.CharField(max_length=255, blank=True, null=True)  # last download error of a failed or pending row
+    attempts = models.PositiveIntegerField(default=0)  # failed downloads since the last success
+    retry_at = models.DateTimeField(blank=True, null=True)  # earliest retry by retry_failed_files
     
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('bucket', 'wasabi_key')  # ensures no duplicate file entries per bucket
+        # Full keys are too long for a unique index, their hash keeps one entry per key per bucket
+        unique_together = ('bucket', 'wasabi_key_hash')
+        # A (bucket, wasabi_key(255)) prefix index for startswith queries is created by migration 0013,
+        # Django cannot declare prefix lengths
+        indexes = [
+            models.Index(fields=['bucket', 'folder_hash', 'basename'], name='filebackup_folder_name_idx'),
+            models.Index(fields=['bucket', 'status'], name='filebackup_status_idx'),
+            models.Index(fields=['created_at'], name='filebackup_created_idx'),
+            models.Index(fields=['basename'], name='filebackup_basename_idx'),
+            models.Index(fields=['extension', 'basename'], name='filebackup_extension_idx'),
+        ]
+
+    @staticmethod
+    def hash_key(wasabi_key):
+        """SHA256 hex digest of a wasabi_key, as stored in wasabi_key_hash"""
+        return hashlib.sha256(wasabi_key.encode()).hexdigest()
+
+    @staticmethod
+    def folder_of(wasabi_key):
+        """Folder path a key sits in, "" for the bucket root"""
+        return wasabi_key.rpartition('/')[0]
+
+    @classmethod
+    def derived_fields(cls, wasabi_key):
+        """Index columns computed from the key: hashes and search name/extension"""
+        basename = wasabi_key.rpartition('/')[2]
+        return {
+            'wasabi_key_hash': cls.hash_key(wasabi_key),
+            'folder_hash': BackupFolder.hash_path(cls.folder_of(wasabi_key)),
+            'basename': basename[:191],
+            'extension': os.path.splitext(basename)[1][1:].lower()[:16],
+        }
 
     def save(self, *args, **kwargs):
-        # Compute SHA256 hash of wasabi_key for indexing
-        self.wasabi_key_hash = hashlib.sha256(self.wasabi_key.encode()).hexdigest()
+        # Compute SHA256 hash of wasabi_key and the other index columns
+        for field, value in self.derived_fields(self.wasabi_key).items():
+            setattr(self, field, value)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -76,7 +147,16 @@ class BackupBatch(models.Model):
     finished_at = models.DateTimeField(blank=True, null=True)
     successful_files = models.PositiveIntegerField(default=0)
     failed_files = models.PositiveIntegerField(default=0)
+    deleted_files = models.PositiveIntegerField(default=0)
     completed = models.BooleanField(default=False)
+    cancelled_at = models.DateTimeField(blank=True, null=True)  # stopped by stop_backup, cleared when the batch resumes
+
+    # Resume state: listing shards of this run and, per shard key, the last
+    # key whose downloads are saved ({"last_key": ..., "done": bool})
+    shards = models.JSONField(default=list, blank=True)
+    checkpoint = models.JSONField(default=dict, blank=True)
+    total_objects = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('bucket', 'batch_number')
@@ -84,3 +164,75 @@ class BackupBatch(models.Model):
     def __str__(self):
         return f"Batch {self.batch_number} - {self.bucket.name}"
 
+
+
+class ContentBlob(models.Model):
+    """
+    An object body held once in the content store, named by its SHA256. Each
+    row maps one Wasabi (ETag, size) to the blob, so the same content uploaded
+    with different multipart layouts still resolves to a single file.
+    """
+    sha256 = models.CharField(max_length=64)
+    etag = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    part_size = models.BigIntegerField(blank=True, null=True)  # multipart part size the ETag was verified with
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('sha256', 'etag')
+        indexes = [
+            models.Index(fields=['etag', 'size'], name='contentblob_etag_idx'),
+        ]
+
+    def __str__(self):
+        return self.sha256
+
+
+class BackupFolder(models.Model):
+    """Object count and size of everything under a folder, kept up to date by backups"""
+    bucket = models.ForeignKey(WasabiBucket, on_delete=models.CASCADE, related_name='folders')
+    path = KeyField(max_length=1024, blank=True)  # "a/b" without trailing slash, "" for the bucket root
+    path_hash = models.CharField(max_length=64)  # SHA256 of path, for exact lookups
+    parent_hash = models.CharField(max_length=64, blank=True, null=True)  # path_hash of the parent folder, null for the root
+    name = models.CharField(max_length=255, blank=True)  # last path segment
+    total_files = models.BigIntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)  # in bytes
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('bucket', 'path_hash')
+        indexes = [
+            models.Index(fields=['bucket', 'parent_hash', 'name'], name='backupfolder_parent_idx'),
+        ]
+
+    @staticmethod
+    def hash_path(path):
+        return hashlib.sha256(path.encode()).hexdigest()
+
+    @classmethod
+    def build(cls, bucket, path, **kwargs):
+        """Unsaved row for a folder path with its parent pointer filled in"""
+        parent, _, name = path.rpartition('/')
+        return cls(
+            bucket=bucket,
+            path=path,
+            path_hash=cls.hash_path(path),
+            parent_hash=cls.hash_path(parent) if path else None,
+            name=name,
+            **kwargs,
+        )
+
+    @staticmethod
+    def ancestors(wasabi_key):
+        """Folder paths containing a key, from the bucket root down"""
+        parts = wasabi_key.split('/')[:-1]
+        return [''] + ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+    @classmethod
+    def for_path(cls, bucket, path):
+        return cls.objects.filter(bucket=bucket, path_hash=cls.hash_path(path)).first()
+
+    def __str__(self):
+        return f"{self.bucket.name}/{self.path}"
@@ -0,0 +1,171 @@
+import json
+import logging
+import threading
+import time
+import uuid
+
+import redis
+from redis import asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE = 15        # seconds between SSE comments on an idle stream
+STATE_TTL = 60 * 60   # last known state of a run outlives a dead worker by this much
+THROUGHPUT_SMOOTHING = 0.3
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _channel(bucket_id):
+    return f"backup_progress:{bucket_id}"
+
+
+def _state_key(bucket_id):
+    return f"backup_progress_state:{bucket_id}"
+
+
+def _redis():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = redis.Redis.from_url(settings.BACKUP_PROGRESS_REDIS_URL)
+        return _client
+
+
+def _publish(bucket_id, event, source=None):
+    """
+    Publish one event and keep the source's latest state in a hash, so a
+    browser that connects mid-backup starts from the current numbers.
+    Progress is best effort, a Redis outage never fails a backup.
+    """
+    message = json.dumps(event)
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        if source:
+            pipe.hset(_state_key(bucket_id), source, message)
+            pipe.expire(_state_key(bucket_id), STATE_TTL)
+        else:
+            pipe.delete(_state_key(bucket_id))
+        pipe.publish(_channel(bucket_id), message)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"Progress publish failed for bucket {bucket_id}: {e}")
+
+
+def publish_state(bucket_id, state, **extra):
+    """Bucket-wide event ("completed", "failed", ...) that also clears per-run state"""
+    _publish(bucket_id, {"bucket": bucket_id, "state": state, **extra})
+
+
+class ProgressReporter:
+    """
+    Coalesces per-object progress of one backup run into at most one Redis
+    publish per BACKUP_PROGRESS_INTERVAL. Sharded backups run one reporter per
+    shard task, each under its own source id, and subscribers sum them.
+    """
+
+    def __init__(self, bucket, batch_number, interval=None):
+        self.bucket_id = bucket.id
+        self.bucket_name = bucket.name
+        self.batch_number = batch_number
+        self.interval = settings.BACKUP_PROGRESS_INTERVAL if interval is None else interval
+        self.source = uuid.uuid4().hex[:8]
+        self.started = time.monotonic()
+        self.total = 0
+        self.done = 0
+        self.bytes = 0
+        self.listing = True
+        self.throughput = 0.0
+        self.extra = {}
+        self._last_publish = 0.0
+        self._last_bytes = 0
+
+    def update(self, total, done, nbytes=0, **extra):
+        """Record the latest counters, publishing only when the interval has passed"""
+        self.total = total
+        self.done = done
+        self.bytes += nbytes
+        self.extra.update(extra)
+        if time.monotonic() - self._last_publish >= self.interval:
+            self.publish()
+
+    def finish(self):
+        """Publish the final numbers of this run"""
+        self.listing = False
+        self.publish(state="finished")
+
+    def eta(self):
+        """Seconds left at the average object rate so far, None until there is a rate"""
+        elapsed = time.monotonic() - self.started
+        if not self.done or not elapsed:
+            return None
+        return round(max(0, self.total - self.done) * elapsed / self.done)
+
+    def publish(self, state="running"):
+        now = time.monotonic()
+        if self._last_publish:
+            rate = (self.bytes - self._last_bytes) / max(now - self._last_publish, 1e-6)
+            self.throughput += THROUGHPUT_SMOOTHING * (rate - self.throughput)
+        self._last_publish = now
+        self._last_bytes = self.bytes
+        _publish(
+            self.bucket_id,
+            {
+                **self.extra,
+                "bucket": self.bucket_id,
+                "name": self.bucket_name,
+                "source": self.source,
+                "state": state,
+                "batch": self.batch_number,
+                "listing": self.listing,
+                "total": self.total,
+                "done": self.done,
+                "bytes": self.bytes,
+                "throughput": round(self.throughput),
+                "eta": self.eta(),
+            },
+            source=self.source,
+        )
+
+
+def _sse(data):
+    if isinstance(data, bytes):
+        data = data.decode()
+    return f"data: {data}\n\n"
+
+
+async def stream(bucket_id=None, duration=None):
+    """
+    Server-Sent Events for one bucket, or every bucket when bucket_id is None:
+    the current state of running backups first, then live events. Waiting on
+    Redis doesn't block a thread, so serve it from ASGI (see asgi.py). The
+    stream ends after BACKUP_PROGRESS_STREAM_SECONDS so dead connections are
+    dropped; EventSource reconnects after the retry delay and gets a fresh
+    snapshot.
+    """
+    duration = settings.BACKUP_PROGRESS_STREAM_SECONDS if duration is None else duration
+    deadline = time.monotonic() + duration
+    client = aioredis.Redis.from_url(settings.BACKUP_PROGRESS_REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        # Subscribe before reading the snapshot so no event falls in between
+        if bucket_id is None:
+            await pubsub.psubscribe(_channel("*"))
+            keys = [key async for key in client.scan_iter(_state_key("*"))]
+        else:
+            await pubsub.subscribe(_channel(bucket_id))
+            keys = [_state_key(bucket_id)]
+
+        yield "retry: 3000\n\n"
+        for key in keys:
+            for value in (await client.hgetall(key)).values():
+                yield _sse(value)
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(KEEPALIVE, remaining))
+            yield _sse(message["data"]) if message else ": keepalive\n\n"
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,143 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import WasabiBucket, BackupBatch
+
+logger = logging.getLogger(__name__)
+
+NEVER_BACKED_UP_HOURS = 24 * 365  # staleness assumed for buckets without a completed backup
+FAILURE_WEIGHT = 0.5  # share of the score a bucket that always fails gives up
+
+
+def is_large(bucket):
+    return bucket.total_size >= settings.BACKUP_LARGE_BUCKET_SIZE
+
+
+def bucket_queue(bucket):
+    """Celery queue a bucket's backup tasks are routed to"""
+    return settings.BACKUP_LARGE_BUCKET_QUEUE if is_large(bucket) else settings.BACKUP_SMALL_BUCKET_QUEUE
+
+
+def priority(bucket, churn, now):
+    """
+    Higher runs first. Staleness in hours drives the score, so the bucket
+    that has waited longest is picked first and worst-case staleness stays
+    low. It is boosted by churn (share of files changed by the last backup)
+    and scaled down by the bucket's failure ratio. Size only routes and caps
+    buckets, a large one waiting on a free large slot never loses its place.
+    """
+    if bucket.last_backup_at:
+        staleness = (now - bucket.last_backup_at).total_seconds() / 3600
+    else:
+        staleness = NEVER_BACKED_UP_HOURS
+    attempts = bucket.successful_backups + bucket.failed_backups
+    failure_ratio = bucket.failed_backups / attempts if attempts else 0
+    return staleness * (1 + churn) * (1 - FAILURE_WEIGHT * failure_ratio)
+
+
+def _with_churn(buckets):
+    """Annotate buckets with the files changed or deleted by their last completed batch"""
+    last_batch = BackupBatch.objects.filter(bucket=OuterRef("pk"), completed=True).order_by("-batch_number")
+    return buckets.annotate(
+        last_changed=Subquery(last_batch.values("successful_files")[:1]),
+        last_deleted=Subquery(last_batch.values("deleted_files")[:1]),
+    )
+
+
+def _churn(bucket):
+    changed = (bucket.last_changed or 0) + (bucket.last_deleted or 0)
+    return min(1.0, changed / bucket.total_files) if bucket.total_files else 1.0
+
+
+def claim_due_buckets(force=None):
+    """
+    Pick the requested buckets to start now, highest priority first, within
+    BACKUP_MAX_CONCURRENT_BUCKETS (and BACKUP_MAX_CONCURRENT_LARGE_BUCKETS for
+    large ones). Claimed buckets are marked queued in the same transaction,
+    so concurrent dispatchers never start a bucket twice. force is the id of
+    a bucket started by hand: it is claimed first even when the caps are
+    full, unless a backup of it already holds a slot.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock every bucket row first; the annotated query below reads the batches unlocked
+        list(WasabiBucket.objects.select_for_update().order_by("id").values_list("id", flat=True))
+        _reap_stale_slots(now)
+        buckets = list(_with_churn(WasabiBucket.objects.order_by("id")))
+        running = [b for b in buckets if b.backup_queued_at]
+        slots = settings.BACKUP_MAX_CONCURRENT_BUCKETS - len(running)
+        large_slots = settings.BACKUP_MAX_CONCURRENT_LARGE_BUCKETS - sum(is_large(b) for b in running)
+
+        claimed = []
+        forced = [b for b in buckets if b.id == force and b not in running]
+        for bucket in forced:
+            slots -= 1
+            large_slots -= is_large(bucket)
+            claimed.append(bucket)
+
+        due = [
+            b for b in buckets
+            if b.backup_requested_at and b not in running and b not in forced
+        ]
+        # Between equal scores the smaller bucket goes first, it frees its slot sooner
+        due.sort(key=lambda b: (-priority(b, _churn(b), now), b.total_size))
+
+        for bucket in due:
+            if slots <= 0:
+                break
+            if is_large(bucket):
+                if large_slots <= 0:
+                    continue
+                large_slots -= 1
+            slots -= 1
+            claimed.append(bucket)
+
+        WasabiBucket.objects.filter(id__in=[b.id for b in claimed]).update(
+            backup_requested_at=None, backup_queued_at=now
+        )
+    return claimed
+
+
+def _reap_stale_slots(now):
+    """
+    Free the slots of backups that stopped heartbeating (see heartbeat) for
+    BACKUP_DISPATCH_TIMEOUT, e.g. a worker killed by the time limit or OOM,
+    and request those buckets again so their batch resumes. Runs with the
+    bucket rows locked.
+    """
+    stale = WasabiBucket.objects.filter(
+        backup_queued_at__lt=now - timedelta(seconds=settings.BACKUP_DISPATCH_TIMEOUT)
+    )
+    names = list(stale.values_list("name", flat=True))
+    if not names:
+        return
+    logger.warning(f"Reclaiming scheduler slots of stalled backups: {', '.join(names)}")
+    stale.update(
+        backup_queued_at=None,
+        backup_requested_at=Coalesce("backup_requested_at", Value(now)),
+        last_backup_completed=False,
+    )
+
+
+def heartbeat(bucket_id):
+    """Keep a running backup's slot from going stale, however long the run takes"""
+    WasabiBucket.objects.filter(id=bucket_id, backup_queued_at__isnull=False).update(
+        backup_queued_at=timezone.now()
+    )
+
+
+def worst_staleness(now=None):
+    """Hours since the least recently backed up bucket finished a backup"""
+    now = now or timezone.now()
+    if not WasabiBucket.objects.exists():
+        return None
+    if WasabiBucket.objects.filter(last_backup_at__isnull=True).exists():
+        return NEVER_BACKED_UP_HOURS
+    oldest = WasabiBucket.objects.order_by("last_backup_at").values_list("last_backup_at", flat=True).first()
+    return round((now - oldest).total_seconds() / 3600, 1)
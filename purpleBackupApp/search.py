@@ -0,0 +1,88 @@
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import FileBackup
+
+NGRAM_TOKEN_SIZE = 2  # MySQL ngram_token_size default, shorter terms can't use the FULLTEXT index
+
+# Rank tiers, higher sorts first
+RANK_EXACT = 3
+RANK_PREFIX = 2
+RANK_SUBSTRING = 1
+
+
+def parse_query(q, match=None, ext=None):
+    """
+    Split user input into (term, match, ext). Inline "ext:pdf" sets the
+    extension filter, a trailing "*" asks for a prefix match and a "/" in
+    the term searches full key paths instead of filenames.
+    """
+    terms = []
+    for token in (q or "").split():
+        if token.lower().startswith("ext:"):
+            ext = token[4:]
+        else:
+            terms.append(token)
+    term = " ".join(terms)
+    if term.endswith("*"):
+        term, match = term.rstrip("*"), match if match == "path" else "prefix"
+    if "/" in term:
+        match = "path"
+    if match == "path":
+        term = term.lstrip("/")
+    ext = (ext or "").lstrip(".").lower() or None
+    return term, match if match in ("prefix", "substring", "path") else "substring", ext
+
+
+def _fulltext_match(files, term):
+    # A quoted phrase makes the ngram index return only names containing the term's ngrams in order
+    phrase = '"%s"' % term.replace('"', " ")
+    return files.annotate(
+        relevance=RawSQL("MATCH (basename) AGAINST (%s IN BOOLEAN MODE)", (phrase,))
+    ).filter(relevance__gt=0)
+
+
+def search_files(q, bucket_id=None, match=None, ext=None):
+    """
+    FileBackup rows whose filename matches the query, annotated with an
+    integer rank. In "path" mode the term is a key prefix like
+    "photos/2024/", matched on the (bucket, wasabi_key(255)) prefix index.
+    """
+    term, match, ext = parse_query(q, match, ext)
+    if not term and not ext:
+        return FileBackup.objects.none()
+
+    files = FileBackup.objects.exclude(status="deleted")
+    if bucket_id:
+        files = files.filter(bucket_id=bucket_id)
+    if ext:
+        files = files.filter(extension=ext)
+
+    if not term:
+        return files.annotate(rank=Value(RANK_SUBSTRING, output_field=IntegerField()))
+
+    if match == "path":
+        return files.filter(wasabi_key__startswith=term).annotate(
+            rank=Case(
+                When(wasabi_key=term, then=Value(RANK_EXACT)),
+                default=Value(RANK_PREFIX),
+                output_field=IntegerField(),
+            )
+        )
+
+    if match == "prefix":
+        files = files.filter(basename__startswith=term)
+    else:
+        if connection.vendor == "mysql" and len(term) >= NGRAM_TOKEN_SIZE:
+            files = _fulltext_match(files, term)
+        files = files.filter(basename__icontains=term)
+
+    return files.annotate(
+        rank=Case(
+            When(basename=term, then=Value(RANK_EXACT)),
+            When(basename__startswith=term, then=Value(RANK_PREFIX)),
+            default=Value(RANK_SUBSTRING),
+            output_field=IntegerField(),
+        )
+    )
@@ -0,0 +1,135 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+STREAM_BLOCK = 64 * 1024  # bytes per chunk of a ranged response served by Django
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive and clamped to size.
+    None when the header is absent, malformed or asks for several ranges,
+    which RFC 9110 lets us answer with the whole file. Raises ValueError
+    when the range can't be satisfied.
+    """
+    match = _RANGE_RE.match((header or "").strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last n bytes
+        length = int(last)
+        if not length or not size:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range outside the file")
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """False when If-Range names another version, so the whole file must be sent"""
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith(('"', 'W/"')):
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+
+
+def _offload_header(path):
+    """(header, value) handing the transfer to the front proxy, None when disabled or path is outside its root"""
+    mode = settings.BACKUP_FILE_OFFLOAD
+    if not mode:
+        return None
+    root = os.path.realpath(settings.BACKUP_FILE_OFFLOAD_ROOT)
+    path = os.path.realpath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    if mode == "x-accel":
+        relative = os.path.relpath(path, root).replace(os.sep, "/")
+        return "X-Accel-Redirect", settings.BACKUP_FILE_OFFLOAD_PREFIX.rstrip("/") + "/" + quote(relative)
+    if mode == "x-sendfile":
+        # Percent-encoded so non-latin-1 paths aren't MIME-encoded by Django;
+        # mod_xsendfile decodes it (XSendFileUnescape, on by default)
+        return "X-Sendfile", quote(path)
+    return None
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length:
+            chunk = f.read(min(STREAM_BLOCK, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(request, path, filename, etag=None, last_modified=None):
+    """
+    Response for a backed up file. Conditional requests are answered from
+    the stored ETag and Last-Modified without opening the file. With
+    BACKUP_FILE_OFFLOAD set, the proxy sends the bytes and handles Range
+    itself. Otherwise Django serves a single Range as 206.
+    """
+    etag = f'"{etag}"' if etag else None
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+
+    def _headers(response):
+        if etag:
+            response.headers["ETag"] = etag
+        if last_modified:
+            response.headers["Last-Modified"] = http_date(last_modified_ts)
+        response.headers["Accept-Ranges"] = "bytes"
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if not_modified is not None:
+        return _headers(not_modified)
+
+    content_type, encoding = mimetypes.guess_type(filename)
+    # Like FileResponse, a compressed file is sent as the archive, not transfer-decoded
+    content_type = "application/octet-stream" if encoding else content_type or "application/octet-stream"
+    disposition = content_disposition_header(False, filename)
+
+    offload = _offload_header(path)
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        response.headers[offload[0]] = offload[1]
+        response.headers["Content-Disposition"] = disposition
+        return _headers(response)
+
+    size = os.path.getsize(path)
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return _headers(response)
+
+    if byte_range is None or not _if_range_matches(request, etag, last_modified):
+        return _headers(FileResponse(open(path, "rb"), as_attachment=False, filename=filename))
+
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        _read_range(path, start, end - start + 1), status=206, content_type=content_type
+    )
+    response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response.headers["Content-Length"] = str(end - start + 1)
+    response.headers["Content-Disposition"] = disposition
+    return _headers(response)
@@ -0,0 +1,64 @@
+// Live backup progress pushed by the workers over Server-Sent Events (views.backup_progress).
+// A sharded backup reports once per shard task ("source"), the numbers shown are their sum.
+
+function formatBytes(bytes) {
+    if (!bytes) return "0 B";
+    const units = ["B", "KB", "MB", "GB", "TB"];
+    let i = 0;
+    while (bytes >= 1024 && i < units.length - 1) { bytes /= 1024; i++; }
+    return `${i ? bytes.toFixed(2) : bytes} ${units[i]}`;
+}
+
+function formatDuration(seconds) {
+    if (seconds == null) return "—";
+    const h = Math.floor(seconds / 3600), m = Math.floor(seconds % 3600 / 60), s = seconds % 60;
+    return h ? `${h}h ${m}m` : m ? `${m}m ${s}s` : `${s}s`;
+}
+
+function watchBackupProgress(url, container, onFinished) {
+    const runs = {};   // bucket id -> {source id -> latest event}
+    const names = {};  // bucket id -> name
+    const states = {}; // bucket id -> last bucket-wide state
+
+    function render() {
+        container.innerHTML = "";
+        const buckets = new Set([...Object.keys(runs), ...Object.keys(states)]);
+        buckets.forEach(bucket => {
+            const line = document.createElement("div");
+            const label = names[bucket] || `Bucket ${bucket}`;
+            const events = Object.values(runs[bucket] || {});
+            if (!events.length) {
+                line.innerText = `${label}: backup ${states[bucket]}`;
+            } else {
+                const sum = key => events.reduce((total, e) => total + (e[key] || 0), 0);
+                const etas = events.map(e => e.eta).filter(eta => eta != null);
+                const listing = events.some(e => e.listing);
+                const limited = events.some(e => e.rate_limited);
+                line.innerText =
+                    `${label}: ${sum("done").toLocaleString()} / ${sum("total").toLocaleString()}${listing ? "+" : ""} files` +
+                    ` · ${formatBytes(sum("bytes"))} · ${formatBytes(sum("throughput"))}/s` +
+                    ` · ETA ${etas.length ? formatDuration(Math.max(...etas)) : "—"}` +
+                    (limited ? " · rate limited" : "");
+            }
+            container.appendChild(line);
+        });
+        container.style.display = buckets.size ? "block" : "none";
+    }
+
+    const source = new EventSource(url);
+    source.onmessage = message => {
+        const event = JSON.parse(message.data);
+        if (event.name) names[event.bucket] = event.name;
+        if (event.source) {
+            (runs[event.bucket] = runs[event.bucket] || {})[event.source] = event;
+            delete states[event.bucket];
+        } else {
+            // Bucket-wide event: the backup completed or failed
+            delete runs[event.bucket];
+            states[event.bucket] = event.state;
+            if (onFinished) onFinished(event, Object.keys(runs).length);
+        }
+        render();
+    };
+    return source;
+}
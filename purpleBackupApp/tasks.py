@@ -1,13 +1,25 @@
-from celery import shared_task
+from celery import shared_task, chord
 from celery.utils.log import get_task_logger
-from .models import WasabiBucket, FileBackup
-import boto3, os
+from .models import WasabiBucket, FileBackup, BackupBatch, BackupFolder
+from .listing import ROOT_SHARD, ChangedRanges, ShardSummary, discover_shards, iter_pages, shard_key
+from .transfer import TransferCancelled, download_object, ensure_dir, in_dir
+from .blobstore import collect_garbage, known_blobs, link_blob, store_blob
+from .throttle import (
+    AdaptiveConcurrency, RateLimiter, RedisTokenBucket, TokenBucket,
+    is_throttle_error, is_transient_error, window_limits,
+)
+from .progress import ProgressReporter, publish_state
+from .scheduler import bucket_queue, claim_due_buckets, heartbeat, worst_staleness
+import boto3, os, random, redis, threading, time
+from botocore.config import Config
 from django.urls import reverse
 from django.conf import settings
 from datetime import datetime, timedelta
 from django.utils import timezone
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from django.db import transaction
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
+from django.db import transaction, connection
+from django.db.models import BigIntegerField, Case, F, Min, Q, Value, When
 from django.core.cache import cache
 
 
@@ -41,119 +53,785 @@ WASABI_ENDPOINTS = {
 
 
 CHUNK_SIZE = 500       # DB write batch size
-MAX_THREADS = 10       # Max threads for downloading files
-def _get_s3_client_for_bucket(bucket_name, access_key, secret_key):
-    base_client = boto3.client(
-        "s3",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=WASABI_ENDPOINTS["us-east-1"],
-        region_name="us-east-1",
-    )
-    loc = base_client.get_bucket_location(Bucket=bucket_name)
+PAGE_KEYS = 1000       # keys diffed against the DB per lookup, one listing page
+OBJECT_RETRIES = 3     # Inline retries of an object failing with a throttle or transient error
+CANCEL_CHECK_INTERVAL = 2  # seconds between checks of a run's cancel flag
+CANCEL_TTL = 60 * 60   # a stop request expires if no run picks it up
+
+
+class BackupCancelled(Exception):
+    """Raised inside a backup run once stop_backup has flagged its bucket"""
+
+
+class ETagMismatch(Exception):
+    """The downloaded bytes don't hash to the object's ETag"""
+
+
+def cancel_key(bucket_id):
+    """Cache key stop_backup sets to cancel a bucket's running backup"""
+    return f"bucket_{bucket_id}_cancel"
+
+# Columns refreshed when a (bucket, wasabi_key_hash) row already exists
+UPSERT_FIELDS = [
+    "folder_hash",
+    "basename",
+    "extension",
+    "etag",
+    "last_modified",
+    "size",
+    "local_path",
+    "local_etag",
+    "part_size",
+    "status",
+    "error",
+    "attempts",
+    "retry_at",
+    "deleted_at",
+    "last_synced",
+    "batch_id",
+    "updated_at",
+]
+
+# Process-wide boto3 clients, one per (region, credentials, pool size), sharing their connection pools
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+def _s3_client(region, access_key, secret_key, pool_size=None):
+    pool_size = max(pool_size or 0, settings.BACKUP_MAX_POOL_CONNECTIONS)
+    key = (region, access_key, secret_key, pool_size)
+    with _s3_clients_lock:
+        client = _s3_clients.get(key)
+        if client is None:
+            client = boto3.client(
+                "s3",
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                endpoint_url=WASABI_ENDPOINTS[region],
+                region_name=region,
+                config=Config(max_pool_connections=pool_size),
+            )
+            _s3_clients[key] = client
+    return client
+
+
+def _pool_size(bucket):
+    """
+    Connections a backup of the bucket can hold at once: every download slot
+    the adaptive controller may open (up to bucket.max_concurrency), each
+    fetching BACKUP_PART_CONCURRENCY ranges, plus the listing threads.
+    """
+    return bucket.max_concurrency * settings.BACKUP_PART_CONCURRENCY + settings.BACKUP_LISTING_WORKERS
+
+
+def _bucket_region(bucket, access_key, secret_key):
+    """Region of a bucket from the cache, else get_bucket_location, remembered on the row"""
+    cache_key = f"bucket_region_{bucket.name}"
+    region = cache.get(cache_key)
+    if region:
+        return region
+
+    try:
+        loc = _s3_client("us-east-1", access_key, secret_key).get_bucket_location(Bucket=bucket.name)
+    except Exception:
+        if bucket.region:
+            logger.warning(f"Region lookup failed for {bucket.name}, using stored region {bucket.region}")
+            return bucket.region
+        raise
     region = (loc.get("LocationConstraint") or "us-east-1").lower().replace("_", "-")
-    endpoint = WASABI_ENDPOINTS.get(region)
-    if not endpoint:
+    if region not in WASABI_ENDPOINTS:
         raise Exception(f"Region {region} not in WASABI_ENDPOINTS mapping: {loc}")
-    client = boto3.client(
-        "s3",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=endpoint,
-        region_name=region,
-    )
-    logger.info(f"✅Found bucket {bucket_name} in region {region}")
+
+    cache.set(cache_key, region, timeout=settings.BACKUP_REGION_CACHE_TTL)
+    if bucket.region != region:
+        bucket.region = region
+        bucket.save(update_fields=["region"])
+    return region
+
+
+def _get_s3_client_for_bucket(bucket, access_key, secret_key):
+    region = _bucket_region(bucket, access_key, secret_key)
+    client = _s3_client(region, access_key, secret_key, _pool_size(bucket))
+    logger.info(f"✅Found bucket {bucket.name} in region {region}")
     return client, region
 
 
 
-def _download_file(bucket, s3_client, obj):
-    """Download single file and return dict for DB"""
-    key = obj["Key"]
+def _local_path(bucket, key):
     local_path = os.path.join(settings.LOCAL_BACKUP_PATH, bucket.name, key)
-    os.makedirs(os.path.dirname(local_path), exist_ok=True)
-    s3_client.download_file(bucket.name, key, local_path)
+    ensure_dir(os.path.dirname(local_path))
+    return local_path
+
+
+def _file_record(bucket, obj, local_path, local_etag, part_size):
     return {
         "bucket": bucket,
-        "wasabi_key": key,
+        "wasabi_key": obj["Key"],
         "etag": obj.get("ETag", "").strip('"'),
         "last_modified": obj["LastModified"],
         "size": obj["Size"],
         "local_path": local_path,
+        "local_etag": local_etag,
+        "part_size": part_size,
         "status": "synced"
     }
 
 
-def _bulk_save(records):
-    """Batch insert/update DB"""
+def _retry_delay(attempts):
+    """Seconds before retrying a row that failed attempts times: exponential, capped, with jitter"""
+    delay = min(settings.BACKUP_RETRY_MAX_DELAY, settings.BACKUP_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _failed_record(bucket, obj, error, attempts=1):
+    """DB dict of an object whose download failed, due for retry_failed_files after a backoff"""
+    record = _file_record(bucket, obj, _local_path(bucket, obj["Key"]), None, None)
+    record.update(
+        status="failed",
+        error=str(error)[:255],
+        attempts=attempts,
+        retry_at=timezone.now() + timedelta(seconds=_retry_delay(attempts)),
+    )
+    return record
+
+
+def _download_file(bucket, s3_client, obj, limiter=None, cancelled=None):
+    """Download single file and return dict for DB, raises ETagMismatch if the bytes don't match the ETag"""
+    local_path = _local_path(bucket, obj["Key"])
+    local_etag, part_size, sha256 = in_dir(
+        local_path, lambda: download_object(s3_client, bucket.name, obj, local_path, limiter, cancelled)
+    )
+    etag = obj.get("ETag", "").strip('"')
+    if local_etag is not None and local_etag != etag:
+        raise ETagMismatch(f"ETag mismatch: expected {etag}, got {local_etag}")
+    if settings.BACKUP_CONTENT_STORE and local_etag is not None:
+        store_blob(local_path, etag, obj["Size"], part_size, sha256)
+    return _file_record(bucket, obj, local_path, local_etag, part_size)
+
+
+def _link_known_blob(bucket, obj, blobs):
+    """DB dict of an object the content store already holds, linked instead of downloaded, else None"""
+    etag = obj.get("ETag", "").strip('"')
+    blob = blobs.get((etag, obj["Size"]))
+    if blob is None:
+        return None
+    local_path = _local_path(bucket, obj["Key"])
+    if not link_blob(blob[0], local_path):
+        return None
+    # Only verified downloads enter the store
+    return _file_record(bucket, obj, local_path, etag, blob[1])
+
+
+def _download_batch(bucket, s3_client, objs, controller, cancelled, limiter=None):
+    """
+    Download a batch of objects in one worker, returns their DB dicts. Throttled
+    and transient failures are retried with jittered exponential backoff, an
+    object that still fails gets a "failed" dict instead of aborting the run.
+    Stops early once cancelled is set, also in the middle of a large object.
+    """
+    records = []
+    blobs = known_blobs(objs) if settings.BACKUP_CONTENT_STORE else {}
+    for obj in objs:
+        if cancelled.is_set():
+            break
+        record = _link_known_blob(bucket, obj, blobs) if blobs else None
+        if record:
+            records.append(record)
+            continue
+        for attempt in range(OBJECT_RETRIES + 1):
+            started = time.monotonic()
+            try:
+                record = _download_file(bucket, s3_client, obj, limiter, cancelled)
+            except TransferCancelled:
+                # Not recorded, the next run picks the object up again
+                return records
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                if throttled:
+                    controller.record_throttle()
+                # An ETag mismatch is not retried here, the same bytes would most likely come back
+                retryable = throttled or is_transient_error(e)
+                if not retryable or attempt == OBJECT_RETRIES:
+                    logger.warning(f"⚠️ Download of {bucket.name}/{obj['Key']} failed: {e}")
+                    record = _failed_record(bucket, obj, e)
+                    break
+                if cancelled.wait(random.uniform(0, 2 ** attempt)):
+                    return records
+                continue
+            controller.record(obj["Size"], time.monotonic() - started)
+            break
+        records.append(record)
+    return records
+
+
+def _bulk_save(records, batch_id=0):
+    """Batch upsert DB rows, one INSERT ... ON DUPLICATE KEY UPDATE per chunk"""
+    now = timezone.now()
     objs = [
         FileBackup(
             bucket=r["bucket"],
             wasabi_key=r["wasabi_key"],
+            **FileBackup.derived_fields(r["wasabi_key"]),
             etag=r["etag"],
             last_modified=r["last_modified"],
             size=r["size"],
             local_path=r["local_path"],
-            status=r["status"]
+            local_etag=r.get("local_etag"),
+            part_size=r.get("part_size"),
+            status=r["status"],
+            error=r.get("error"),
+            attempts=r.get("attempts", 0),
+            retry_at=r.get("retry_at"),
+            last_synced=now,
+            batch_id=batch_id,
         )
         for r in records
     ]
-    FileBackup.objects.bulk_create(objs, ignore_conflicts=True)
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    unique_fields = (
+        ["bucket", "wasabi_key_hash"]
+        if connection.features.supports_update_conflicts_with_target
+        else None
+    )
+    FileBackup.objects.bulk_create(
+        objs,
+        batch_size=CHUNK_SIZE,
+        update_conflicts=True,
+        update_fields=UPSERT_FIELDS,
+        unique_fields=unique_fields,
+    )
+
+
+def _existing_files(bucket, keys):
+    """Return {key: (etag, size, status)} of stored rows for one listing page, tombstones count as missing"""
+    hashes = [FileBackup.hash_key(key) for key in keys]
+    return {
+        key: (etag, size, status)
+        for key, etag, size, status in FileBackup.objects.filter(bucket=bucket, wasabi_key_hash__in=hashes)
+        .exclude(status="deleted")
+        .values_list("wasabi_key", "etag", "size", "status")
+    }
+
+
+def _shard_rows(bucket, shard):
+    """Live FileBackup rows a listing shard covers"""
+    rows = FileBackup.objects.filter(bucket=bucket).exclude(status="deleted")
+    if not shard["recursive"]:
+        return rows.filter(folder_hash=BackupFolder.hash_path(shard["prefix"].rstrip("/")))
+    if shard["prefix"]:
+        return rows.filter(wasabi_key__startswith=shard["prefix"])
+    return rows
+
+
+def _stale_rows(rows, listed_keys):
+    """
+    Yield (id, key, size) of the rows that are missing from listed_keys. Both
+    sides are sorted by key (wasabi_key has a binary collation, like S3
+    listings), so one merge pass finds them while rows are read in keyset chunks.
+    """
+    rows = rows.order_by("wasabi_key")
+    listed = iter(listed_keys)
+    current = next(listed, None)
+    after = None
+    while True:
+        chunk = rows.filter(wasabi_key__gt=after) if after is not None else rows
+        chunk = list(chunk.values_list("id", "wasabi_key", "size")[:CHUNK_SIZE])
+        for row_id, key, size in chunk:
+            while current is not None and current < key:
+                current = next(listed, None)
+            if key != current:
+                yield row_id, key, size
+        if len(chunk) < CHUNK_SIZE:
+            return
+        after = chunk[-1][1]
+
 
+def _orphaned_rows(bucket, shard, shards):
+    """
+    Rows under a flat shard's prefix in sub-prefixes that no shard lists any
+    more, i.e. folders deleted since the previous backup. Walks the key ranges
+    between the prefix's child shards. Rows without a folder_hash (not yet
+    backfilled) can't be placed in a folder and are left alone.
+    """
+    prefix = shard["prefix"]
+    children = sorted(
+        s["prefix"] for s in shards
+        if s["prefix"] != prefix and s["prefix"].startswith(prefix)
+        and "/" not in s["prefix"][len(prefix):-1]
+    )
+    rows = (
+        _shard_rows(bucket, {"prefix": prefix, "recursive": True})
+        .filter(folder_hash__isnull=False)
+        .exclude(folder_hash=BackupFolder.hash_path(prefix.rstrip("/")))
+    )
+    lower = None
+    for child in children + [None]:
+        gap = rows
+        if lower is not None:
+            gap = gap.filter(wasabi_key__gte=lower)
+        if child is not None:
+            gap = gap.filter(wasabi_key__lt=child)
+            lower = child[:-1] + "0"  # first key after everything under child/
+        yield from _stale_rows(gap, [])
+
+
+def _mark_deleted(bucket, batch_id, rows):
+    """Tombstone rows whose objects are gone from the bucket and take them out of the stats"""
+    deltas = {}
+    for _, key, size in rows:
+        for path in BackupFolder.ancestors(key):
+            d = deltas.setdefault(path, [0, 0])
+            d[0] -= 1
+            d[1] -= size
+    with transaction.atomic():
+        FileBackup.objects.filter(id__in=[row[0] for row in rows]).update(
+            status="deleted", deleted_at=timezone.now()
+        )
+        _apply_stats(bucket, deltas)
+        BackupBatch.objects.filter(id=batch_id).update(deleted_files=F("deleted_files") + len(rows))
 
-def _backup_bucket(bucket, s3_client, task=None):
-    paginator = s3_client.get_paginator("list_objects_v2")
-    page_iterator = paginator.paginate(Bucket=bucket.name)
 
-    existing_files = {
-        f.wasabi_key: f.etag
-        for f in FileBackup.objects.filter(bucket=bucket).only("wasabi_key", "etag")
+_rate_limit_client = None
+_rate_limit_lock = threading.Lock()
+
+
+def _rate_limit_redis():
+    global _rate_limit_client
+    with _rate_limit_lock:
+        if _rate_limit_client is None:
+            _rate_limit_client = redis.Redis.from_url(settings.BACKUP_RATE_LIMIT_REDIS_URL)
+        return _rate_limit_client
+
+
+def _rate_limits(bucket):
+    """
+    Current bytes/s and requests/s caps, 0 = unlimited. Time-of-day windows
+    override the settings defaults, a bucket's own limits override the
+    per-bucket defaults.
+    """
+    limits = {
+        "global_bytes": settings.BACKUP_BANDWIDTH_LIMIT,
+        "global_requests": settings.BACKUP_REQUEST_RATE_LIMIT,
+        "bucket_bytes": settings.BACKUP_BUCKET_BANDWIDTH_LIMIT,
+        "bucket_requests": settings.BACKUP_BUCKET_REQUEST_RATE_LIMIT,
     }
+    limits.update(window_limits(settings.BACKUP_RATE_LIMIT_WINDOWS, timezone.localtime().time()))
+    if bucket.bandwidth_limit is not None:
+        limits["bucket_bytes"] = bucket.bandwidth_limit
+    if bucket.request_rate_limit is not None:
+        limits["bucket_requests"] = bucket.request_rate_limit
+    return limits
+
+
+def _rate_limiter(bucket):
+    """RateLimiter for one backup run; global limits are shared by every worker, bucket limits by its shard tasks"""
+    def _make_bucket(name, rate):
+        if not settings.BACKUP_RATE_LIMIT_REDIS_URL:
+            return TokenBucket(rate)
+        scope = name.replace("bucket_", f"bucket_{bucket.id}_", 1)
+        return RedisTokenBucket(_rate_limit_redis(), f"backup_rate_limit:{scope}", rate)
+
+    return RateLimiter(lambda: _rate_limits(bucket), _make_bucket)
+
+
+def _plus(field, delta):
+    """F(field) + delta, floored at 0 so drifted stats can't go negative (total_files is unsigned)"""
+    if delta >= 0:
+        return F(field) + delta
+    return Case(
+        When(**{f"{field}__gt": -delta}, then=F(field) - abs(delta)),
+        default=Value(0),
+        output_field=BigIntegerField(),
+    )
 
-    total_objs = 0
-    completed = 0
-    downloaded_records = []
 
-    with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        futures = []
+def _apply_stats(bucket, deltas):
+    """Add {folder path: [files, bytes]} deltas to BackupFolder rows and the bucket totals"""
+    deltas = {path: d for path, d in deltas.items() if d[0] or d[1]}
+    if not deltas:
+        return
+    # Sorted so concurrent shard tasks lock folder rows in the same order
+    paths = sorted(deltas)
+    with transaction.atomic():
+        root_files, root_size = deltas.get("", (0, 0))
+        WasabiBucket.objects.filter(id=bucket.id).update(
+            total_files=_plus("total_files", root_files),
+            total_size=_plus("total_size", root_size),
+        )
+        BackupFolder.objects.bulk_create(
+            [BackupFolder.build(bucket, path) for path in paths],
+            ignore_conflicts=True,
+        )
+        for path in paths:
+            files, size = deltas[path]
+            BackupFolder.objects.filter(bucket=bucket, path_hash=BackupFolder.hash_path(path)).update(
+                total_files=_plus("total_files", files),
+                total_size=_plus("total_size", size),
+            )
 
-        for page in page_iterator:
-            objects = page.get("Contents", [])
-            total_objs += len(objects)
 
-            for obj in objects:
-                key = obj["Key"]
-                if key.endswith("/") and obj["Size"] == 0:
-                    completed += 1
-                    continue
+def _discover_shards(bucket, s3_client):
+    if settings.BACKUP_LISTING_WORKERS > 1 or settings.BACKUP_CELERY_SHARDS > 1:
+        shards = discover_shards(s3_client, bucket)
+        logger.info(f"Split {bucket.name} into {len(shards)} listing shards")
+        return shards
+    return [ROOT_SHARD]
+
+
+def _open_batch(bucket, s3_client):
+    """Resume the bucket's recent unfinished batch, or start a new one"""
+    resume_after = timezone.now() - timedelta(seconds=settings.BACKUP_RESUME_WINDOW)
+    batch = (
+        bucket.batches.filter(completed=False, updated_at__gte=resume_after)
+        .order_by("-batch_number")
+        .first()
+    )
+    if batch:
+        logger.info(f"Resuming batch {batch.batch_number} of {bucket.name} from its checkpoint")
+        if batch.cancelled_at:
+            batch.cancelled_at = None
+            batch.save(update_fields=["cancelled_at", "updated_at"])
+        return batch
+
+    last = bucket.batches.order_by("-batch_number").first()
+    return BackupBatch.objects.create(
+        bucket=bucket,
+        batch_number=last.batch_number + 1 if last else 1,
+        shards=_discover_shards(bucket, s3_client),
+    )
+
+
+def _previous_summaries(bucket, batch):
+    """Shard key -> listing summary recorded by the bucket's last completed batch"""
+    previous = (
+        bucket.batches.filter(completed=True, batch_number__lt=batch.batch_number)
+        .order_by("-batch_number")
+        .only("checkpoint")
+        .first()
+    )
+    if previous is None:
+        return {}
+    return {key: state["summary"] for key, state in previous.checkpoint.items() if state.get("summary")}
 
-                etag = obj.get("ETag", "").strip('"')
-                if existing_files.get(key) == etag:
-                    completed += 1
-                    continue
 
-                futures.append(executor.submit(_download_file, bucket, s3_client, obj))
+def _pending_shards(batch):
+    """Shards of the batch not yet finished by an earlier run"""
+    return [s for s in batch.shards if not batch.checkpoint.get(shard_key(s), {}).get("done")]
 
-        for future in as_completed(futures):
-            record = future.result()
-            if record:
-                downloaded_records.append(record)
-                completed += 1
 
-                cache.set(
-                    f"bucket_{bucket.id}_progress",
-                    {"total": total_objs, "done": completed, "last_key": record["wasabi_key"]},
-                    timeout=3600,
-                )
+def _save_checkpoint(batch_id, shard_states, successful=0, objects=0, failed=0):
+    """Merge shard states and counters into the batch row, locked against sibling shard tasks"""
+    with transaction.atomic():
+        batch = BackupBatch.objects.select_for_update().get(id=batch_id)
+        for key, state in shard_states.items():
+            batch.checkpoint.setdefault(key, {}).update(state)
+        batch.successful_files += successful
+        batch.failed_files += failed
+        batch.total_objects += objects
+        batch.save(update_fields=["checkpoint", "successful_files", "failed_files", "total_objects", "updated_at"])
+    heartbeat(batch.bucket_id)
 
-                if len(downloaded_records) >= CHUNK_SIZE:
-                    _bulk_save(downloaded_records)
-                    downloaded_records = []
 
-    if downloaded_records:
-        _bulk_save(downloaded_records)
+class _BackupRun:
+    """
+    One list/diff/download pass over a set of shards. The last key of every
+    shard whose downloads are all saved is checkpointed on the batch, so an
+    interrupted run restarts listing from there.
+    """
 
-    cache.delete(f"bucket_{bucket.id}_progress")
+    def __init__(self, bucket, s3_client, batch):
+        self.bucket = bucket
+        self.s3_client = s3_client
+        self.batch = batch
+        self.controller = AdaptiveConcurrency(
+            bucket.min_concurrency,
+            bucket.max_concurrency,
+            initial=settings.BACKUP_INITIAL_CONCURRENCY,
+        )
+        self.total_objs = 0
+        self.completed = 0
+        self.records = []
+        self.previous_sizes = {}  # key -> stored size of changed objects in flight
+        self.pending = {}      # future -> (listing page it came from, objects submitted)
+        self.pages = {}        # shard key -> pages not yet fully saved, in listing order
+        self.unsaved_objs = 0  # listed objects not yet counted on the batch
+        self.unsaved_files = 0 # downloaded files not yet counted on the batch
+        self.unsaved_failed = 0  # failed downloads not yet counted on the batch
+        self.swept = {}        # shard key -> last key checked for deletions
+        self.summaries = {}    # shard key -> ShardSummary of shards listed from their first key
+        self.skipped = 0       # listed objects in ranges unchanged since the last backup, not diffed
+        self._previous = None  # shard key -> summary of the last completed batch, read on first use
+        self.progress = ProgressReporter(bucket, batch.batch_number)
+        self.limiter = _rate_limiter(bucket)
+        self.cancelled = threading.Event()
+        self._cancel_checked = 0.0
+        self.last_checkpoint = time.monotonic()
+
+    def run(self, shards):
+        """Back up the given shards, returns the number of objects listed"""
+        start_after = {
+            key: state["last_key"]
+            for key, state in self.batch.checkpoint.items()
+            if state.get("last_key")
+        }
+        # Shards listed from their first key are summarised for the next backup
+        # and, with change detection, compared range by range against the last one
+        ranges = {
+            shard_key(s): ChangedRanges(self._known_ranges(s))
+            for s in shards if shard_key(s) not in start_after
+        }
+        self.summaries = {key: ShardSummary() for key in ranges}
+
+        page_iterator = iter_pages(
+            self.s3_client, self.bucket.name, shards,
+            settings.BACKUP_LISTING_WORKERS, start_after=start_after,
+        )
+        self.swept = dict(start_after)
+
+        with ThreadPoolExecutor(max_workers=self.controller.maximum) as executor:
+            self.executor = executor
+            try:
+                for shard, page in page_iterator:
+                    self._check_cancel()
+                    objects = page.get("Contents", [])
+                    if not objects:
+                        continue
+                    self.total_objs += len(objects)
+                    self.unsaved_objs += len(objects)
+                    key = shard_key(shard)
+                    if key in ranges:
+                        units = ranges[key].feed(objects)
+                    else:
+                        units = [(objects, False, objects[-1]["Key"])]
+                    for objs, unchanged, last_key in units:
+                        self._process(shard, objs, unchanged, last_key)
+
+                    # Flush whatever already finished without blocking the listing
+                    done, _ = wait(self.pending, timeout=0)
+                    self._collect(done)
+
+                for shard in shards:
+                    if shard_key(shard) in ranges:
+                        for objs, unchanged, last_key in ranges[shard_key(shard)].finish():
+                            self._process(shard, objs, unchanged, last_key)
+
+                while self.pending:
+                    done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+            except BackupCancelled:
+                # Stop listing, drop queued downloads and keep whatever already finished
+                page_iterator.close()
+                executor.shutdown(wait=True, cancel_futures=True)
+                self._collect([f for f in self.pending if not f.cancelled()])
+                self._flush()
+                logger.info(f"🛑 Backup of {self.bucket.name} cancelled, {self.completed} objects saved")
+                return self.total_objs
+
+        # Everything after each shard's last listed key is gone from the bucket
+        for shard in shards:
+            self._sweep(shard, [], None)
+            if not shard["recursive"]:
+                self._tombstone(_orphaned_rows(self.bucket, shard, self.batch.shards))
+        self._flush()
+        shard_states = {}
+        for shard in shards:
+            key = shard_key(shard)
+            shard_states[key] = {"done": True}
+            if key in self.summaries:
+                shard_states[key]["summary"] = self.summaries[key].as_dict()
+        _save_checkpoint(self.batch.id, shard_states)
+        if self.skipped:
+            logger.info(
+                f"⏭️ {self.skipped} of {self.total_objs} objects of {self.bucket.name} sat in unchanged "
+                f"key ranges, their diff was skipped"
+            )
+        self.progress.update(self.total_objs, self.completed)
+        self.progress.finish()
+        return self.total_objs
+
+    def _known_ranges(self, shard):
+        """
+        Key ranges the last completed batch summarised for the shard, None when
+        there is nothing to compare against. Shards holding failed or pending
+        rows get none, so every page is diffed and those rows downloaded again.
+        """
+        if not settings.BACKUP_CHANGE_DETECTION:
+            return None
+        if self._previous is None:
+            self._previous = _previous_summaries(self.bucket, self.batch)
+        known = self._previous.get(shard_key(shard), {}).get("ranges")
+        if not known or _shard_rows(self.bucket, shard).filter(status__in=("failed", "pending")).exists():
+            return None
+        return known
+
+    def _process(self, shard, objects, unchanged, last_key):
+        """
+        Handle one key range of a shard's listing ending at last_key. An
+        unchanged range only moves the checkpoint and sweep position, the
+        others are diffed against the DB a listing page at a time.
+        """
+        key = shard_key(shard)
+        if key in self.summaries:
+            self.summaries[key].add(objects, last_key)
+        if unchanged:
+            self.completed += len(objects)
+            self.skipped += len(objects)
+            self.swept[key] = last_key
+            self.pages.setdefault(key, deque()).append({"last_key": last_key, "remaining": 0, "listed": True})
+            return
+        for start in range(0, max(len(objects), 1), PAGE_KEYS):
+            page = objects[start:start + PAGE_KEYS]
+            self._diff_page(shard, page, last_key if start + PAGE_KEYS >= len(objects) else page[-1]["Key"])
+
+    def _diff_page(self, shard, objects, upto):
+        """Tombstone rows up to upto that weren't listed and queue downloads of new and changed objects"""
+        entry = {"last_key": upto, "remaining": 0, "listed": False}
+        self.pages.setdefault(shard_key(shard), deque()).append(entry)
+        self._sweep(shard, [obj["Key"] for obj in objects], upto)
+
+        existing_files = _existing_files(self.bucket, [obj["Key"] for obj in objects]) if objects else {}
+        small_threshold = settings.BACKUP_SMALL_OBJECT_THRESHOLD
+        small_batch_size = settings.BACKUP_SMALL_OBJECT_BATCH
+        small_objs = []
+
+        for obj in objects:
+            key = obj["Key"]
+            if key.endswith("/") and obj["Size"] == 0:
+                self.completed += 1
+                continue
+
+            etag = obj.get("ETag", "").strip('"')
+            existing = existing_files.get(key)
+            # Failed and pending rows are downloaded again even when the ETag is unchanged
+            if existing and existing[0] == etag and existing[2] == "synced":
+                self.completed += 1
+                continue
+            if existing:
+                self.previous_sizes[key] = existing[1]
+
+            if obj["Size"] > small_threshold:
+                self._submit([obj], entry)
+                continue
+
+            # Small objects are batched so one task covers many GETs
+            small_objs.append(obj)
+            if len(small_objs) >= small_batch_size:
+                self._submit(small_objs, entry)
+                small_objs = []
+
+        if small_objs:
+            self._submit(small_objs, entry)
+        entry["listed"] = True
+
+    def _sweep(self, shard, keys, upto):
+        """Tombstone stored rows of the shard between the previous page and this one that were not listed"""
+        key = shard_key(shard)
+        rows = _shard_rows(self.bucket, shard)
+        if self.swept.get(key) is not None:
+            rows = rows.filter(wasabi_key__gt=self.swept[key])
+        if upto is not None:
+            rows = rows.filter(wasabi_key__lte=upto)
+        self._tombstone(_stale_rows(rows, keys))
+        self.swept[key] = upto
+
+    def _tombstone(self, stale_rows):
+        stale = []
+        for row in stale_rows:
+            stale.append(row)
+            if len(stale) >= CHUNK_SIZE:
+                _mark_deleted(self.bucket, self.batch.id, stale)
+                stale = []
+        if stale:
+            _mark_deleted(self.bucket, self.batch.id, stale)
+
+    def _check_cancel(self):
+        """Raise BackupCancelled once the bucket's cancel flag is set, polling the cache at most every few seconds"""
+        if self.cancelled.is_set() or time.monotonic() - self._cancel_checked < CANCEL_CHECK_INTERVAL:
+            return
+        self._cancel_checked = time.monotonic()
+        if cache.get(cancel_key(self.bucket.id)):
+            self.cancelled.set()
+            raise BackupCancelled()
+
+    def _submit(self, objs, entry):
+        # The controller's current limit caps how many downloads run at once
+        while len(self.pending) >= self.controller.limit:
+            done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+            self._collect(done)
+        future = self.executor.submit(
+            _download_batch, self.bucket, self.s3_client, objs, self.controller, self.cancelled, self.limiter
+        )
+        entry["remaining"] += 1
+        self.pending[future] = (entry, len(objs))
+
+    def _collect(self, done):
+        for future in done:
+            entry, submitted = self.pending.pop(future)
+            records = future.result()
+            # A batch cut short by a cancel leaves its page unfinished, so a resumed run lists it again
+            if len(records) == submitted:
+                entry["remaining"] -= 1
+            if not records:
+                continue
+            self.records.extend(records)
+            self.completed += len(records)
+            self.progress.update(
+                self.total_objs,
+                self.completed,
+                sum(r["size"] for r in records),
+                last_key=records[-1]["wasabi_key"],
+                **self.controller.snapshot(),
+                **self.limiter.snapshot(),
+            )
+
+        if (
+            len(self.records) >= CHUNK_SIZE
+            or time.monotonic() - self.last_checkpoint >= settings.BACKUP_CHECKPOINT_INTERVAL
+        ):
+            self._flush()
+        self._check_cancel()
+
+    def _flush(self):
+        """Save buffered records and their stats, then checkpoint every shard up to its last fully saved page"""
+        if self.records:
+            _bulk_save(self.records, batch_id=self.batch.batch_number)
+            deltas = {}
+            for r in self.records:
+                previous = self.previous_sizes.pop(r["wasabi_key"], None)
+                files, size = (1, r["size"]) if previous is None else (0, r["size"] - previous)
+                for path in BackupFolder.ancestors(r["wasabi_key"]):
+                    d = deltas.setdefault(path, [0, 0])
+                    d[0] += files
+                    d[1] += size
+            _apply_stats(self.bucket, deltas)
+            failed = sum(1 for r in self.records if r["status"] != "synced")
+            self.unsaved_files += len(self.records) - failed
+            self.unsaved_failed += failed
+            self.records = []
+
+        shard_states = {}
+        for key, pages in self.pages.items():
+            while pages and pages[0]["listed"] and not pages[0]["remaining"]:
+                shard_states[key] = {"last_key": pages.popleft()["last_key"]}
+
+        _save_checkpoint(self.batch.id, shard_states, self.unsaved_files, self.unsaved_objs, self.unsaved_failed)
+        self.unsaved_files = 0
+        self.unsaved_failed = 0
+        self.unsaved_objs = 0
+        self.last_checkpoint = time.monotonic()
+
+
+def _release_slot(bucket_id):
+    """Give the bucket's scheduler slot back and start the next due bucket"""
+    WasabiBucket.objects.filter(id=bucket_id).update(backup_queued_at=None)
+    dispatch_backups.delay()
+
+
+def _mark_backup_completed(bucket, total_objs, batch):
+    batch.refresh_from_db()
+    batch.completed = True
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=["completed", "finished_at", "updated_at"])
 
     bucket.last_backup_at = timezone.now()
     bucket.last_backup_completed = True
@@ -161,7 +839,40 @@ def _backup_bucket(bucket, s3_client, task=None):
     bucket.save(update_fields=["last_backup_at", "last_backup_completed", "successful_backups"])
 
     logger.info(f"✅ Backup completed for bucket {bucket.name}, total files processed: {total_objs}")
-    return total_objs
+    publish_state(bucket.id, "completed", name=bucket.name, batch=batch.batch_number, total=total_objs)
+    _release_slot(bucket.id)
+
+    if settings.BACKUP_DELETED_RETENTION_DAYS:
+        prune_deleted_files.delay(bucket.id)
+    if batch.failed_files:
+        _schedule_retry(bucket.id, settings.BACKUP_RETRY_BASE_DELAY)
+    if settings.BACKUP_CONTENT_STORE:
+        # Blobs released by this run's replaced files are collected by a later one, after the grace period
+        collect_blobs.delay()
+
+
+def _mark_backup_cancelled(bucket, batch):
+    """Record a stopped run, the batch stays incomplete with its checkpoint so the next backup resumes it"""
+    cache.delete(cancel_key(bucket.id))
+    BackupBatch.objects.filter(id=batch.id).update(cancelled_at=timezone.now())
+    WasabiBucket.objects.filter(id=bucket.id).update(last_backup_completed=False)
+    publish_state(bucket.id, "cancelled", name=bucket.name, batch=batch.batch_number)
+    _release_slot(bucket.id)
+    logger.info(f"🛑 Backup of bucket {bucket.name} stopped, batch {batch.batch_number} will resume next run")
+
+
+def _mark_backup_failed(bucket_id, error):
+    WasabiBucket.objects.filter(id=bucket_id).update(
+        last_backup_completed=False, failed_backups=F("failed_backups") + 1
+    )
+    publish_state(bucket_id, "failed", error=str(error))
+    _release_slot(bucket_id)
+
+
+def _group_shards(shards, count):
+    """Deal shards round-robin into at most count groups"""
+    groups = [shards[i::count] for i in range(count)]
+    return [g for g in groups if g]
 
 
 
@@ -172,40 +883,270 @@ def trigger_incremental_backup(self, bucket_id):
         bucket = WasabiBucket.objects.get(id=bucket_id)
         # pass keys from settings
         s3_client, region = _get_s3_client_for_bucket(
-            bucket.name,
+            bucket,
             settings.WASABI_ACCESS_KEY,
             settings.WASABI_SECRET_KEY
         )
-        total_files = _backup_bucket(bucket, s3_client, task=self)
+        cache.delete(cancel_key(bucket.id))  # a stop request never outlives the run it was meant for
+        batch = _open_batch(bucket, s3_client)
+        groups = _group_shards(_pending_shards(batch), settings.BACKUP_CELERY_SHARDS)
+        if len(groups) > 1:
+            # Fan the shards out to other workers, the chord callback marks completion
+            # and its error handler failure, so the slot is released once all shards ended
+            queue = bucket_queue(bucket)
+            callback = finalize_sharded_backup.s(bucket.id, batch.id).set(queue=queue)
+            callback.link_error(sharded_backup_failed.s(bucket.id))
+            result = chord(
+                backup_shard.s(bucket.id, batch.id, shards).set(queue=queue) for shards in groups
+            )(callback)
+            logger.info(f"Backup of {bucket.name} fanned out as {len(groups)} shard tasks")
+            return {"status": "sharded", "bucket": bucket.name, "shards": len(groups), "chord_id": result.id}
+
+        backup = _BackupRun(bucket, s3_client, batch)
+        total_files = backup.run(groups[0] if groups else [])
+        if backup.cancelled.is_set():
+            _mark_backup_cancelled(bucket, batch)
+            return {"status": "cancelled", "bucket": bucket.name, "files": total_files}
+        _mark_backup_completed(bucket, total_files, batch)
         return {"status": "completed", "bucket": bucket.name, "files": total_files}
     except Exception as e:
         logger.error(f"❌ Backup failed for bucket {bucket_id}: {e}", exc_info=True)
+        _mark_backup_failed(bucket_id, e)
         raise
 
 
+@shared_task(bind=True)
+def backup_shard(self, bucket_id, batch_id, shards):
+    """Backup a group of listing shards of one bucket"""
+    try:
+        bucket = WasabiBucket.objects.get(id=bucket_id)
+        batch = BackupBatch.objects.get(id=batch_id)
+        s3_client, region = _get_s3_client_for_bucket(
+            bucket,
+            settings.WASABI_ACCESS_KEY,
+            settings.WASABI_SECRET_KEY
+        )
+        backup = _BackupRun(bucket, s3_client, batch)
+        total_files = backup.run(shards)
+        status = "cancelled" if backup.cancelled.is_set() else "completed"
+        return {"status": status, "bucket": bucket.name, "files": total_files}
+    except Exception as e:
+        # Sibling shards may still be running, sharded_backup_failed records the failure once the chord ends
+        logger.error(f"❌ Shard backup failed for bucket {bucket_id} {shards}: {e}", exc_info=True)
+        raise
+
+
+@shared_task
+def sharded_backup_failed(request, exc, traceback, bucket_id):
+    """Chord error handler: a shard task or the callback failed, record it and release the slot"""
+    logger.error(f"❌ Sharded backup failed for bucket {bucket_id}: {exc}")
+    _mark_backup_failed(bucket_id, exc)
+
+
+@shared_task(bind=True)
+def finalize_sharded_backup(self, results, bucket_id, batch_id):
+    """Chord callback: aggregate shard counts and mark the bucket backed up"""
+    bucket = WasabiBucket.objects.get(id=bucket_id)
+    batch = BackupBatch.objects.get(id=batch_id)
+    total_files = sum(r["files"] for r in results)
+    if any(r["status"] == "cancelled" for r in results):
+        _mark_backup_cancelled(bucket, batch)
+        return {"status": "cancelled", "bucket": bucket.name, "files": total_files, "shards": len(results)}
+    _mark_backup_completed(bucket, total_files, batch)
+    return {"status": "completed", "bucket": bucket.name, "files": total_files, "shards": len(results)}
+
+
+@shared_task(bind=True)
+def prune_deleted_files(self, bucket_id=None):
+    """Remove local copies and rows of objects deleted longer ago than the retention period"""
+    days = settings.BACKUP_DELETED_RETENTION_DAYS
+    if not days:
+        return {"status": "disabled"}
+    cutoff = timezone.now() - timedelta(days=days)
+    buckets = WasabiBucket.objects.all()
+    if bucket_id:
+        buckets = buckets.filter(id=bucket_id)
+
+    pruned = 0
+    for bucket in buckets:
+        expired = FileBackup.objects.filter(bucket=bucket, status="deleted", deleted_at__lt=cutoff)
+        while True:
+            rows = list(expired.values_list("id", "local_path")[:CHUNK_SIZE])
+            if not rows:
+                break
+            for _, local_path in rows:
+                try:
+                    os.remove(local_path)
+                except FileNotFoundError:
+                    pass
+            FileBackup.objects.filter(id__in=[row_id for row_id, _ in rows]).delete()
+            pruned += len(rows)
+
+    logger.info(f"🧹 Pruned {pruned} deleted files older than {days} days")
+    return {"status": "pruned", "files": pruned}
+
+
+def _retry_key(bucket_id):
+    return f"bucket_{bucket_id}_retry_scheduled"
+
+
+def _schedule_retry(bucket_id, countdown):
+    """Queue retry_failed_files for a bucket unless a retry is already queued"""
+    countdown = max(1, int(countdown))
+    if cache.add(_retry_key(bucket_id), 1, timeout=countdown + 60):
+        retry_failed_files.apply_async(args=[bucket_id], countdown=countdown)
+
+
+def _save_retried(records, attempts, batch_number):
+    """Upsert retried rows, pushing back retry_at of the ones still failing. Returns (synced, failed)."""
+    failed = 0
+    for r in records:
+        n = attempts.pop(r["wasabi_key"]) + 1
+        if r["status"] == "synced":
+            continue
+        r["attempts"] = n
+        r["retry_at"] = timezone.now() + timedelta(seconds=_retry_delay(n))
+        failed += 1
+    # Same key, ETag and size as the stored row, so the folder stats don't change
+    _bulk_save(records, batch_id=batch_number)
+    return len(records) - failed, failed
+
+
+@shared_task(bind=True)
+def retry_failed_files(self, bucket_id):
+    """
+    Download the failed and pending rows of a bucket that are due again,
+    without listing the bucket. Each failure pushes the row's retry_at back
+    exponentially until BACKUP_RETRY_ATTEMPTS is reached, the next full
+    backup still picks those rows up.
+    """
+    cache.delete(_retry_key(bucket_id))
+    bucket = WasabiBucket.objects.get(id=bucket_id)
+    if bucket.backup_queued_at:
+        # A full backup is running and downloads these rows itself
+        return {"status": "skipped", "bucket": bucket.name}
+
+    rows = FileBackup.objects.filter(
+        bucket=bucket, status__in=["failed", "pending"], attempts__lt=settings.BACKUP_RETRY_ATTEMPTS
+    )
+    now = timezone.now()
+    due = rows.filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now))
+    s3_client, region = _get_s3_client_for_bucket(
+        bucket,
+        settings.WASABI_ACCESS_KEY,
+        settings.WASABI_SECRET_KEY
+    )
+    controller = AdaptiveConcurrency(
+        bucket.min_concurrency, bucket.max_concurrency, initial=settings.BACKUP_INITIAL_CONCURRENCY
+    )
+    limiter = _rate_limiter(bucket)
+    cancelled = threading.Event()
+    batch_number = bucket.batches.order_by("-batch_number").values_list("batch_number", flat=True).first() or 0
+
+    synced = failed = 0
+    after = 0
+    attempts = {}  # key: failed attempts so far, of rows submitted and not saved yet
+    pending = set()
+    records = []
+    with ThreadPoolExecutor(max_workers=controller.maximum) as executor:
+        while True:
+            chunk = list(
+                due.filter(id__gt=after)
+                .order_by("id")
+                .values_list("id", "wasabi_key", "etag", "size", "last_modified", "attempts")[:CHUNK_SIZE]
+            )
+            if not chunk:
+                break
+            after = chunk[-1][0]
+            attempts.update((key, n) for _, key, _, _, _, n in chunk)
+            objs = [
+                {"Key": key, "ETag": etag, "Size": size, "LastModified": last_modified}
+                for _, key, etag, size, last_modified, _ in chunk
+            ]
+            step = settings.BACKUP_SMALL_OBJECT_BATCH
+            for i in range(0, len(objs), step):
+                # Same cap as _BackupRun._submit, the controller backs off when Wasabi throttles
+                while len(pending) >= controller.limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    records += [r for future in done for r in future.result()]
+                pending.add(executor.submit(
+                    _download_batch, bucket, s3_client, objs[i:i + step], controller, cancelled, limiter
+                ))
+            if len(records) >= CHUNK_SIZE:
+                ok, bad = _save_retried(records, attempts, batch_number)
+                synced, failed, records = synced + ok, failed + bad, []
+        records += [r for future in wait(pending)[0] for r in future.result()]
+    ok, bad = _save_retried(records, attempts, batch_number)
+    synced, failed = synced + ok, failed + bad
+
+    next_retry = rows.aggregate(next_retry=Min("retry_at"))["next_retry"]
+    if next_retry:
+        _schedule_retry(bucket.id, (next_retry - timezone.now()).total_seconds())
+    logger.info(f"🔁 Retried {synced + failed} files of {bucket.name}: {synced} synced, {failed} still failing")
+    return {"status": "retried", "bucket": bucket.name, "synced": synced, "failed": failed}
+
+
+@shared_task(bind=True)
+def collect_blobs(self):
+    """Delete content-store blobs that no backed up key links to any more"""
+    removed = collect_garbage(settings.BACKUP_BLOB_GC_GRACE)
+    logger.info(f"🧹 Collected {removed} unreferenced blobs")
+    return {"status": "collected", "blobs": removed}
+
+
+def _dispatch(force=None):
+    """Queue the backups claim_due_buckets hands out, returns {bucket id: AsyncResult}"""
+    claimed = claim_due_buckets(force)
+    results = {
+        bucket.id: trigger_incremental_backup.apply_async(args=[bucket.id], queue=bucket_queue(bucket))
+        for bucket in claimed
+    }
+    if claimed:
+        logger.info(f"Dispatched backups of {', '.join(b.name for b in claimed)}")
+    return results
+
+
+def start_backup(bucket_id):
+    """
+    Start a backup requested by hand. It takes a scheduler slot like a
+    dispatched one, so the slot it releases when it ends was its own.
+    Returns the task's AsyncResult, None when the bucket is already backing up.
+    """
+    return _dispatch(force=bucket_id).get(bucket_id)
+
+
+@shared_task
+def dispatch_backups():
+    """Start the highest-priority requested buckets that fit in the free scheduler slots"""
+    return len(_dispatch())
+
+
 @shared_task(bind=True)
 def backup_all_buckets(self):
     """Trigger incremental backup for all buckets"""
     try:
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.WASABI_ACCESS_KEY,
-            aws_secret_access_key=settings.WASABI_SECRET_KEY,
-            endpoint_url=WASABI_ENDPOINTS["us-east-1"],
-            region_name="us-east-1",
-        )
+        s3_client = _s3_client("us-east-1", settings.WASABI_ACCESS_KEY, settings.WASABI_SECRET_KEY)
         response = s3_client.list_buckets()
         buckets = response.get("Buckets", [])
 
         for b in buckets:
-            bucket_obj, _ = WasabiBucket.objects.get_or_create(
+            WasabiBucket.objects.get_or_create(
                 name=b["Name"],
                 defaults={"display_name": b["Name"]}
             )
-            trigger_incremental_backup.apply_async(args=[bucket_obj.id])
 
-        logger.info(f"✅ Global backup triggered for {len(buckets)} buckets")
-        return {"status": "all triggered"}
+        # Request every bucket once; dispatch_backups starts them in priority order within the slot caps
+        WasabiBucket.objects.filter(
+            name__in=[b["Name"] for b in buckets], backup_requested_at__isnull=True
+        ).update(backup_requested_at=timezone.now())
+        started = dispatch_backups()
+
+        staleness = worst_staleness()
+        logger.info(
+            f"✅ Global backup requested for {len(buckets)} buckets, {started} started, "
+            f"worst staleness {staleness}h"
+        )
+        return {"status": "all triggered", "started": started, "worst_staleness_hours": staleness}
     except Exception as e:
         logger.error(f"❌ Global backup failed: {e}", exc_info=True)
         raise
@@ -1,3 +1,611 @@
-from django.test import TestCase
+import hashlib
+import io
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import boto3
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import archive, listing, scheduler, search, serving, tasks, transfer, views
+from .management.commands import check_query_plans
+from .models import WasabiBucket, FileBackup, BackupBatch, BackupFolder
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+TEST_BUCKET = "purple-test-bucket"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@skipUnless(ThreadedMotoServer, "moto is not installed, run: pip install -r requirements-dev.txt")
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    BACKUP_LISTING_WORKERS=1,
+    BACKUP_CELERY_SHARDS=1,
+    BACKUP_CHANGE_DETECTION=True,
+    BACKUP_CONTENT_STORE=False,
+    BACKUP_RATE_LIMIT_REDIS_URL="",
+)
+class BackupRunTestCase(TestCase):
+    """Backup runs against a local moto S3 server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)  # moto logs every request
+        cls.port = _free_port()
+        cls.server = ThreadedMotoServer(port=cls.port, verbose=False)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.s3 = boto3.client(
+            "s3",
+            endpoint_url=f"http://127.0.0.1:{self.port}",
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+            region_name="us-east-1",
+        )
+        self.s3.create_bucket(Bucket=TEST_BUCKET)
+        self.addCleanup(self._empty_bucket)
+        self.workdir = tempfile.mkdtemp(prefix="purple_tests_")
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        local = override_settings(LOCAL_BACKUP_PATH=self.workdir)
+        local.enable()
+        self.addCleanup(local.disable)
+        # Progress goes to Redis, which the tests don't need
+        patcher = mock.patch("purpleBackupApp.progress._publish")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bucket = WasabiBucket.objects.create(name=TEST_BUCKET)
+
+    def _empty_bucket(self):
+        for obj in self.s3.list_objects_v2(Bucket=TEST_BUCKET).get("Contents", []):
+            self.s3.delete_object(Bucket=TEST_BUCKET, Key=obj["Key"])
+        self.s3.delete_bucket(Bucket=TEST_BUCKET)
+
+    def put(self, key, body):
+        self.s3.put_object(Bucket=TEST_BUCKET, Key=key, Body=body)
+
+    def backup(self, complete=True):
+        """One backup pass like trigger_incremental_backup, returns the _BackupRun"""
+        self.bucket.refresh_from_db()
+        cache.delete(tasks.cancel_key(self.bucket.id))
+        batch = tasks._open_batch(self.bucket, self.s3)
+        run = tasks._BackupRun(self.bucket, self.s3, batch)
+        run.run(tasks._pending_shards(batch))
+        if complete and not run.cancelled.is_set():
+            BackupBatch.objects.filter(id=batch.id).update(completed=True, finished_at=timezone.now())
+        return run
+
+    def row(self, key):
+        return FileBackup.objects.get(bucket=self.bucket, wasabi_key_hash=FileBackup.hash_key(key))
+
+    def local(self, key):
+        return os.path.join(self.workdir, TEST_BUCKET, key)
+
+
+class ChangeDetectionTests(BackupRunTestCase):
+
+    def test_unchanged_shard_with_failed_rows_is_not_skipped(self):
+        self.put("a.txt", b"alpha")
+        self.put("b.txt", b"bravo")
+        self.backup()
+        self.assertEqual(self.row("b.txt").status, "synced")
+
+        FileBackup.objects.filter(id=self.row("b.txt").id).update(status="failed", error="boom")
+        os.remove(self.local("b.txt"))
+
+        self.backup()
+        self.assertEqual(self.row("b.txt").status, "synced")
+        with open(self.local("b.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"bravo")
+
+    def test_unchanged_bucket_skips_the_diff(self):
+        self.put("a.txt", b"alpha")
+        self.backup()
+        with mock.patch.object(tasks, "_existing_files", wraps=tasks._existing_files) as existing:
+            self.backup()
+        existing.assert_not_called()
+
+    def test_changed_bucket_is_listed_once(self):
+        for key in ("a.txt", "b.txt", "c.txt"):
+            self.put(key, b"v1")
+        self.backup()
+        self.put("b.txt", b"v2")
+        self.put("d.txt", b"new")
+
+        with mock.patch.object(listing, "list_shard", wraps=listing.list_shard) as list_shard, \
+                mock.patch.object(tasks, "_download_file", wraps=tasks._download_file) as download:
+            self.backup()
+        self.assertEqual(list_shard.call_count, 1)
+        self.assertEqual(sorted(call.args[2]["Key"] for call in download.call_args_list), ["b.txt", "d.txt"])
+        with open(self.local("b.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"v2")
+
+    def test_unchanged_ranges_skip_the_diff_around_a_change(self):
+        keys = [f"k{i:02d}" for i in range(9)]
+        for key in keys:
+            self.put(key, b"v1")
+        with mock.patch.object(listing, "RANGE_SIZE", 3):
+            self.backup()
+            self.put("k04", b"v2")
+            with mock.patch.object(tasks, "_existing_files", wraps=tasks._existing_files) as existing:
+                self.backup()
+        # Only the middle range was compared against the DB
+        self.assertEqual([call.args[1] for call in existing.call_args_list], [["k03", "k04", "k05"]])
+        self.assertEqual(self.row("k04").etag, self.s3.head_object(Bucket=TEST_BUCKET, Key="k04")["ETag"].strip('"'))
+
+
+@override_settings(BACKUP_CHECKPOINT_INTERVAL=0)
+class ResumeTests(BackupRunTestCase):
+
+    def test_cancelled_run_resumes_from_its_checkpoint(self):
+        keys = [f"f{i}.txt" for i in range(6)]
+        for key in keys:
+            self.put(key, key.encode())
+
+        real_list_shard = listing.list_shard
+        real_iter_pages = tasks.iter_pages
+
+        def small_pages(s3_client, bucket_name, shard, **kwargs):
+            return real_list_shard(s3_client, bucket_name, shard, MaxKeys=2, **kwargs)
+
+        def cancel_after_first_page(*args, **kwargs):
+            for number, item in enumerate(real_iter_pages(*args, **kwargs)):
+                if number == 1:
+                    # Stop once the first page is on disk, before the second one is diffed
+                    deadline = time.monotonic() + 10
+                    while not all(os.path.exists(self.local(key)) for key in keys[:2]):
+                        self.assertLess(time.monotonic(), deadline)
+                        time.sleep(0.05)
+                    cache.set(tasks.cancel_key(self.bucket.id), 1)
+                yield item
+
+        with mock.patch.object(listing, "list_shard", small_pages), \
+                mock.patch.object(tasks, "CANCEL_CHECK_INTERVAL", 0):
+            with mock.patch.object(tasks, "iter_pages", cancel_after_first_page):
+                run = self.backup()
+            self.assertTrue(run.cancelled.is_set())
+            batch = BackupBatch.objects.get(bucket=self.bucket)
+            self.assertFalse(batch.completed)
+            self.assertEqual(batch.checkpoint[listing.shard_key(listing.ROOT_SHARD)]["last_key"], keys[1])
+
+            with mock.patch.object(tasks, "_download_file", wraps=tasks._download_file) as download:
+                self.backup()
+
+        # The same batch finished, without downloading the first page again
+        self.assertEqual(download.call_count, 4)
+        batch.refresh_from_db()
+        self.assertTrue(batch.checkpoint[listing.shard_key(listing.ROOT_SHARD)]["done"])
+        self.assertEqual(BackupBatch.objects.filter(bucket=self.bucket).count(), 1)
+        self.assertEqual(
+            sorted(FileBackup.objects.filter(bucket=self.bucket, status="synced").values_list("wasabi_key", flat=True)),
+            keys,
+        )
+        self.bucket.refresh_from_db()
+        self.assertEqual(self.bucket.total_files, 6)
+
+
+@override_settings(BACKUP_LISTING_WORKERS=2)
+class DeletedFolderSweepTests(BackupRunTestCase):
+
+    def test_sweep_spares_rows_without_folder_hash(self):
+        self.put("root.txt", b"root")
+        self.put("keep/1.txt", b"one")
+        self.put("gone/2.txt", b"two")
+        self.backup()
+
+        # Rows written before folder_hash existed
+        FileBackup.objects.filter(wasabi_key__in=["root.txt", "keep/1.txt"]).update(folder_hash=None)
+        # Stats that drifted below what the tombstones take away
+        WasabiBucket.objects.filter(id=self.bucket.id).update(total_files=0, total_size=0)
+        self.s3.delete_object(Bucket=TEST_BUCKET, Key="gone/2.txt")
+
+        self.backup()
+        self.assertEqual(self.row("gone/2.txt").status, "deleted")
+        self.assertEqual(self.row("root.txt").status, "synced")
+        self.assertEqual(self.row("keep/1.txt").status, "synced")
+        self.bucket.refresh_from_db()
+        self.assertEqual(self.bucket.total_files, 0)
+        self.assertEqual(self.bucket.total_size, 0)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        bucket = WasabiBucket.objects.create(name=TEST_BUCKET)
+        for key in ("photos/2024/beach.jpg", "photos/2025/snow.jpg", "docs/photos.txt"):
+            FileBackup.objects.create(
+                bucket=bucket, wasabi_key=key, etag="etag", last_modified=timezone.now(),
+                size=1, local_path="/tmp/" + key, status="synced", batch_id=1,
+            )
+
+    def test_slash_searches_key_paths(self):
+        keys = sorted(f.wasabi_key for f in search.search_files("photos/2024/"))
+        self.assertEqual(keys, ["photos/2024/beach.jpg"])
+        keys = sorted(f.wasabi_key for f in search.search_files("/photos/"))
+        self.assertEqual(keys, ["photos/2024/beach.jpg", "photos/2025/snow.jpg"])
+
+    def test_path_mode_without_slash(self):
+        keys = sorted(f.wasabi_key for f in search.search_files("photos", match="path"))
+        self.assertEqual(keys, ["photos/2024/beach.jpg", "photos/2025/snow.jpg"])
+        self.assertEqual(search.parse_query("photos*", match="path"), ("photos", "path", None))
+
+
+@skipUnless(connection.vendor == "mysql", "query plans are only checked on MySQL")
+class QueryPlanTests(TestCase):
+    """The check_query_plans queries on a few thousand rows, each must use its index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        bucket = WasabiBucket.objects.create(id=1, name="plans")
+        now = timezone.now()
+        files, folders = [], []
+        for i in range(2000):
+            key = f"photos/{2000 + i % 25}/{i % 40}/img{i}.{('jpg', 'pdf', 'txt')[i % 3]}"
+            files.append(FileBackup(
+                bucket=bucket, wasabi_key=key, **FileBackup.derived_fields(key), etag="etag",
+                last_modified=now, size=i, local_path="/tmp/" + key,
+                status="failed" if i % 50 == 0 else "synced", batch_id=1,
+            ))
+        for year in range(2000, 2025):
+            folders += [BackupFolder.build(bucket, f"photos/{year}/{i}") for i in range(40)]
+        FileBackup.objects.bulk_create(files)
+        BackupFolder.objects.bulk_create(folders)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE TABLE {FileBackup._meta.db_table}, {BackupFolder._meta.db_table}")
+
+    def test_queries_use_their_indexes(self):
+        for label, queryset, indexes, _ in check_query_plans._plans():
+            with self.subTest(label):
+                plan = check_query_plans.explain(queryset)
+                self.assertFalse(check_query_plans.full_scan(plan), plan)
+                self.assertTrue(check_query_plans.uses_index(plan, indexes), plan)
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_wrong_shaped_cursors_fall_back_to_the_first_page(self):
+        for cursor in (5, "x", [], ["d"], ["x", None], ["f", ["a"]], [1, "key"], ["1", "key", 2], [True, "k", 1]):
+            value = views._encode_cursor(cursor)
+            self.assertIsNone(views._decode_cursor(value, views._is_folder_cursor), cursor)
+            self.assertIsNone(views._decode_cursor(value, views._is_search_cursor), cursor)
+        self.assertIsNone(views._decode_cursor("not base64!", views._is_search_cursor))
+
+    def test_valid_cursors_round_trip(self):
+        folder = ["f", ["report.pdf", 42]]
+        self.assertEqual(views._decode_cursor(views._encode_cursor(folder), views._is_folder_cursor), folder)
+        search_cursor = [2, "a/b.txt", 7]
+        self.assertEqual(views._decode_cursor(views._encode_cursor(search_cursor), views._is_search_cursor), search_cursor)
+
+
+@override_settings(BACKUP_MAX_CONCURRENT_BUCKETS=1, BACKUP_DISPATCH_TIMEOUT=3600)
+class SchedulerSlotTests(TestCase):
+
+    def setUp(self):
+        self.running = WasabiBucket.objects.create(name="running", backup_queued_at=timezone.now())
+        self.idle = WasabiBucket.objects.create(name="idle")
+
+    def test_manual_start_claims_a_slot_even_when_the_caps_are_full(self):
+        claimed = scheduler.claim_due_buckets(force=self.idle.id)
+        self.assertEqual([b.id for b in claimed], [self.idle.id])
+        self.idle.refresh_from_db()
+        self.assertIsNotNone(self.idle.backup_queued_at)
+
+    def test_manual_start_of_a_running_bucket_claims_nothing(self):
+        self.assertEqual(scheduler.claim_due_buckets(force=self.running.id), [])
+
+    def test_heartbeat_keeps_a_long_run_from_going_stale(self):
+        WasabiBucket.objects.filter(id=self.running.id).update(
+            backup_queued_at=timezone.now() - timedelta(hours=3)
+        )
+        scheduler.heartbeat(self.running.id)
+        self.assertEqual(scheduler.claim_due_buckets(force=self.running.id), [])
+        # A released slot is not taken back
+        scheduler.heartbeat(self.idle.id)
+        self.idle.refresh_from_db()
+        self.assertIsNone(self.idle.backup_queued_at)
+
+
+class _PartSizes:
+    """head_object stand-in answering PartNumber HEADs from a list of part sizes"""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def head_object(self, PartNumber, **kwargs):
+        return {"ContentLength": self.sizes[PartNumber - 1]}
+
+
+class ETagHasherTests(SimpleTestCase):
+
+    def test_equal_parts_are_verifiable(self):
+        hasher = transfer.etag_hasher(_PartSizes([10, 10, 5]), "b", "k", "abc-3", 25)
+        self.assertEqual(hasher.part_size, 10)
+
+    def test_variable_parts_are_unverifiable(self):
+        # Part count doesn't fit part 1's size
+        self.assertIsNone(transfer.etag_hasher(_PartSizes([10, 20, 5]), "b", "k", "abc-3", 35))
+        # Part count fits, the last part doesn't
+        self.assertIsNone(transfer.etag_hasher(_PartSizes([10, 5, 8]), "b", "k", "abc-3", 23))
+
+
+class _RangedBody:
+    """get_object stand-in serving byte ranges of data, setting cancelled once the range at cancel_at is asked for"""
+
+    def __init__(self, data, cancelled=None, cancel_at=None):
+        self.data = data
+        self.cancelled = cancelled
+        self.cancel_at = cancel_at
+
+    def get_object(self, Range, **kwargs):
+        start, end = map(int, Range[len("bytes="):].split("-"))
+        if self.cancelled is not None and start == self.cancel_at:
+            self.cancelled.set()
+        return {"Body": io.BytesIO(self.data[start:end + 1])}
+
+
+class CancelTransferTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_cancel_between_parts_keeps_the_resume_state(self):
+        data = os.urandom(40)
+        path = os.path.join(self.tmp, "obj")
+        cancelled = threading.Event()
+        with self.assertRaises(transfer.TransferCancelled):
+            transfer.download_ranged(
+                _RangedBody(data, cancelled, cancel_at=20), "b", "k", len(data), "abc", path,
+                part_size=10, concurrency=1, cancelled=cancelled,
+            )
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(path + ".part.state"))
+
+        transfer.download_ranged(
+            _RangedBody(data), "b", "k", len(data), "abc", path,
+            part_size=10, concurrency=1, cancelled=threading.Event(),
+        )
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertFalse(os.path.exists(path + ".part.state"))
+
+    @override_settings(BACKUP_HASH_BUFFER=16)
+    def test_digests_cover_resumed_and_fetched_ranges(self):
+        data = os.urandom(95)
+        path = os.path.join(self.tmp, "obj")
+        cancelled = threading.Event()
+        with self.assertRaises(transfer.TransferCancelled):
+            transfer.download_ranged(
+                _RangedBody(data, cancelled, cancel_at=50), "b", "k", len(data), "abc", path,
+                part_size=10, concurrency=4, hasher=transfer.ETagHasher(), cancelled=cancelled,
+            )
+        content = hashlib.sha256()
+        local_etag = transfer.download_ranged(
+            _RangedBody(data), "b", "k", len(data), "abc", path,
+            part_size=10, concurrency=4, hasher=transfer.ETagHasher(), content=content,
+        )
+        self.assertEqual(local_etag, hashlib.md5(data).hexdigest())
+        self.assertEqual(content.hexdigest(), hashlib.sha256(data).hexdigest())
+
+
+class ArchiveNameTests(SimpleTestCase):
+
+    def test_traversal_segments_are_dropped(self):
+        self.assertEqual(archive.safe_name("../../etc/passwd"), "etc/passwd")
+        self.assertEqual(archive.safe_name("/abs//./x.txt"), "abs/x.txt")
+        self.assertEqual(archive.safe_name("a\\..\\..\\b.txt"), "a/b.txt")
+        self.assertEqual(archive.safe_name("../.."), "")
+        self.assertEqual(archive.safe_name("photos/2024/beach.jpg"), "photos/2024/beach.jpg")
+
+
+class OffloadHeaderTests(SimpleTestCase):
+
+    def test_offload_paths_are_percent_encoded(self):
+        root = tempfile.mkdtemp(prefix="purple_tests_")
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        path = os.path.join(root, "fotos", "año 2024.jpg")
+        with override_settings(BACKUP_FILE_OFFLOAD="x-sendfile", BACKUP_FILE_OFFLOAD_ROOT=root):
+            header, value = serving._offload_header(path)
+        self.assertEqual(header, "X-Sendfile")
+        self.assertTrue(value.endswith("/fotos/a%C3%B1o%202024.jpg"))
+        value.encode("latin-1")
+        with override_settings(
+            BACKUP_FILE_OFFLOAD="x-accel", BACKUP_FILE_OFFLOAD_ROOT=root, BACKUP_FILE_OFFLOAD_PREFIX="/protected/"
+        ):
+            self.assertEqual(serving._offload_header(path), ("X-Accel-Redirect", "/protected/fotos/a%C3%B1o%202024.jpg"))
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(serving.parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(serving.parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(serving.parse_range("bytes=95-200", 100), (95, 99))
+        self.assertEqual(serving.parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(serving.parse_range("bytes=-500", 100), (0, 99))
+
+    def test_ranges_answered_with_the_whole_file(self):
+        for header in (None, "", "bytes=-", "items=0-9", "bytes=0-9,20-29", "bytes=a-b"):
+            self.assertIsNone(serving.parse_range(header, 100), header)
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (("bytes=100-", 100), ("bytes=10-5", 100), ("bytes=-0", 100), ("bytes=-5", 0)):
+            with self.assertRaises(ValueError, msg=header):
+                serving.parse_range(header, size)
+
+
+@override_settings(BACKUP_FILE_OFFLOAD="")
+class ServeFileTests(BackupRunTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.body = bytes(range(256)) * 4
+        self.put("docs/data.bin", self.body)
+        self.backup()
+        self.file = self.row("docs/data.bin")
+        self.url = reverse("serve_file", args=[self.file.id])
+        self.etag = f'"{self.file.etag}"'
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        return response, b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_range(self):
+        response, body = self.get(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.body)}")
+        self.assertEqual(body, self.body[10:20])
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(Range=f"bytes={len(self.body)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.body)}")
+
+    def test_if_range(self):
+        response, body = self.get(Range="bytes=0-3", **{"If-Range": self.etag})
+        self.assertEqual((response.status_code, body), (206, self.body[:4]))
+        # Another version: the whole file
+        response, body = self.get(Range="bytes=0-3", **{"If-Range": '"other"'})
+        self.assertEqual((response.status_code, body), (200, self.body))
+        before = http_date(self.file.last_modified.timestamp() - 60)
+        response, body = self.get(Range="bytes=0-3", **{"If-Range": before})
+        self.assertEqual((response.status_code, body), (200, self.body))
+
+    def test_not_modified(self):
+        response, _ = self.get(**{"If-None-Match": self.etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.etag)
+        response, _ = self.get(**{"If-Modified-Since": http_date(self.file.last_modified.timestamp())})
+        self.assertEqual(response.status_code, 304)
+        response, body = self.get(**{"If-None-Match": '"other"'})
+        self.assertEqual((response.status_code, body), (200, self.body))
+
+    def test_unsynced_copy_is_never_not_modified(self):
+        FileBackup.objects.filter(id=self.file.id).update(status="failed")
+        response, _ = self.get(**{"If-None-Match": self.etag})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(BACKUP_MAX_POOL_CONNECTIONS=64, BACKUP_PART_CONCURRENCY=8, BACKUP_LISTING_WORKERS=4)
+class ClientPoolTests(SimpleTestCase):
+
+    def test_pool_covers_the_bucket_concurrency_ceiling(self):
+        bucket = WasabiBucket(name=TEST_BUCKET, max_concurrency=32)
+        pool_size = tasks._pool_size(bucket)
+        self.assertEqual(pool_size, 32 * 8 + 4)
+        client = tasks._s3_client("us-east-1", "test", "test", pool_size)
+        self.assertEqual(client.meta.config.max_pool_connections, pool_size)
+        # The setting stays the floor
+        client = tasks._s3_client("us-east-1", "test", "test", 2)
+        self.assertEqual(client.meta.config.max_pool_connections, 64)
+
+
+@override_settings(BACKUP_DISPATCH_TIMEOUT=3600)
+class StaleSlotTests(TestCase):
+
+    def test_stalled_backup_slot_is_reaped_and_requested_again(self):
+        stalled = WasabiBucket.objects.create(
+            name="stalled", backup_queued_at=timezone.now() - timedelta(hours=2)
+        )
+        claimed = scheduler.claim_due_buckets()
+        self.assertEqual([b.id for b in claimed], [stalled.id])
+        stalled.refresh_from_db()
+        self.assertIsNone(stalled.backup_requested_at)
+        self.assertIsNotNone(stalled.backup_queued_at)
+        self.assertFalse(stalled.last_backup_completed)
+
+    def test_failed_shard_leaves_the_slot_to_the_chord(self):
+        bucket = WasabiBucket.objects.create(name="sharded", backup_queued_at=timezone.now())
+        batch = BackupBatch.objects.create(bucket=bucket, batch_number=1, shards=[])
+        with mock.patch.object(tasks, "_get_s3_client_for_bucket", side_effect=RuntimeError("boom")), \
+                mock.patch.object(tasks, "publish_state"), mock.patch.object(tasks.dispatch_backups, "delay"):
+            with self.assertRaises(RuntimeError):
+                tasks.backup_shard.run(bucket.id, batch.id, [])
+            bucket.refresh_from_db()
+            self.assertIsNotNone(bucket.backup_queued_at)
+
+            tasks.sharded_backup_failed.run(None, RuntimeError("boom"), None, bucket.id)
+        bucket.refresh_from_db()
+        self.assertIsNone(bucket.backup_queued_at)
+        self.assertEqual(bucket.failed_backups, 1)
+
+
+@override_settings(BACKUP_RETRY_ATTEMPTS=3, BACKUP_RETRY_BASE_DELAY=60, BACKUP_RETRY_MAX_DELAY=3600)
+class RetryFailedFilesTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.bucket = WasabiBucket.objects.create(name=TEST_BUCKET)
+        now = timezone.now()
+        for key, attempts, retry_at in (
+            ("ok.txt", 1, None),
+            ("bad.txt", 2, now - timedelta(minutes=1)),
+            ("capped.txt", 3, None),
+            ("later.txt", 1, now + timedelta(hours=1)),
+        ):
+            FileBackup.objects.create(
+                bucket=self.bucket, wasabi_key=key, etag="etag", last_modified=now, size=1,
+                local_path="/tmp/" + key, status="failed", error="boom", attempts=attempts,
+                retry_at=retry_at, batch_id=1,
+            )
+        self.downloaded = []
+
+    def _download(self, bucket, s3_client, obj, limiter=None, cancelled=None):
+        # Retries are metered by the bucket's rate limiter like a full backup
+        self.assertIsInstance(limiter, tasks.RateLimiter)
+        self.downloaded.append(obj["Key"])
+        if obj["Key"] == "bad.txt":
+            raise ValueError("still broken")
+        return tasks._file_record(bucket, obj, "/tmp/" + obj["Key"], "etag", None)
+
+    def test_due_rows_are_retried_with_backoff_up_to_the_cap(self):
+        started = timezone.now()
+        with override_settings(LOCAL_BACKUP_PATH=self.tmp), \
+                mock.patch.object(tasks, "_get_s3_client_for_bucket", return_value=(None, "us-east-1")), \
+                mock.patch.object(tasks, "_download_file", side_effect=self._download), \
+                mock.patch.object(tasks, "_schedule_retry") as schedule:
+            result = tasks.retry_failed_files.run(self.bucket.id)
+
+        # capped.txt reached BACKUP_RETRY_ATTEMPTS, later.txt isn't due yet
+        self.assertEqual(sorted(self.downloaded), ["bad.txt", "ok.txt"])
+        self.assertEqual((result["synced"], result["failed"]), (1, 1))
+
+        ok = FileBackup.objects.get(bucket=self.bucket, wasabi_key="ok.txt")
+        self.assertEqual((ok.status, ok.error, ok.attempts, ok.retry_at), ("synced", None, 0, None))
+
+        bad = FileBackup.objects.get(bucket=self.bucket, wasabi_key="bad.txt")
+        self.assertEqual((bad.status, bad.attempts), ("failed", 3))
+        # Third attempt: 60s * 2**2, jittered down to at most half
+        self.assertGreaterEqual(bad.retry_at, started + timedelta(seconds=120))
+        self.assertLessEqual(bad.retry_at, timezone.now() + timedelta(seconds=240))
+
+        # Only later.txt is left under the cap, the next retry waits for it
+        schedule.assert_called_once()
+        self.assertGreater(schedule.call_args[0][1], 3000)
@@ -0,0 +1,254 @@
+import threading
+import time
+from datetime import time as dtime
+
+from botocore.exceptions import ClientError, HTTPClientError, IncompleteReadError
+from redis.exceptions import RedisError
+
+THROTTLE_CODES = {"SlowDown", "ServiceUnavailable", "RequestLimitExceeded", "Throttling", "503"}
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+
+
+def is_throttle_error(exc):
+    """True for Wasabi/S3 503 SlowDown style responses"""
+    if not isinstance(exc, ClientError):
+        return False
+    error = exc.response.get("Error", {})
+    status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return error.get("Code") in THROTTLE_CODES or status == 503
+
+
+def is_transient_error(exc):
+    """Network failures, truncated bodies and 5xx responses, worth retrying"""
+    if isinstance(exc, ClientError):
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return status in TRANSIENT_STATUSES
+    if isinstance(exc, (PermissionError, FileNotFoundError)):
+        return False
+    return isinstance(exc, (HTTPClientError, IncompleteReadError, OSError))
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD download concurrency. Every window the limit grows by one while
+    throughput keeps up, shrinks by one when latency climbs without a
+    throughput gain, and is halved whenever the server throttles.
+    """
+
+    LATENCY_TOLERANCE = 2.0  # window latency vs best seen before backing off
+    THROUGHPUT_TOLERANCE = 0.95  # throughput vs previous window to keep growing
+
+    def __init__(self, minimum, maximum, initial=None, window=2.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial or self.minimum))
+        self.window = window
+        self.throttled = 0
+        self.throughput = 0.0
+        self.latency = 0.0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._bytes = 0
+        self._calls = 0
+        self._latency_total = 0.0
+        self._window_throttled = False
+        self._best_latency = None
+
+    def record(self, nbytes, latency):
+        """Account for one finished request"""
+        with self._lock:
+            self._bytes += nbytes
+            self._calls += 1
+            self._latency_total += latency
+            self._maybe_adjust()
+
+    def record_throttle(self):
+        """Multiplicative decrease, at most once per window"""
+        with self._lock:
+            self.throttled += 1
+            if not self._window_throttled:
+                self._window_throttled = True
+                self.limit = max(self.minimum, self.limit // 2)
+            self._maybe_adjust()
+
+    def _maybe_adjust(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.window or not self._calls:
+            return
+
+        throughput = self._bytes / elapsed
+        latency = self._latency_total / self._calls
+        if self._best_latency is None or latency < self._best_latency:
+            self._best_latency = latency
+
+        if not self._window_throttled:
+            if throughput >= self.throughput * self.THROUGHPUT_TOLERANCE:
+                self.limit = min(self.maximum, self.limit + 1)
+            elif latency > self._best_latency * self.LATENCY_TOLERANCE:
+                self.limit = max(self.minimum, self.limit - 1)
+
+        self.throughput = throughput
+        self.latency = latency
+        self._window_start = now
+        self._bytes = 0
+        self._calls = 0
+        self._latency_total = 0.0
+        self._window_throttled = False
+
+    def snapshot(self):
+        """Current state for progress reporting"""
+        return {
+            "concurrency": self.limit,
+            "throughput": round(self.throughput),
+            "latency": round(self.latency, 3),
+            "throttled": self.throttled,
+        }
+
+
+# Reserve n tokens from a bucket shared by every worker, using the Redis clock.
+# Tokens may go negative: the caller then sleeps until the debt is refilled,
+# which keeps large reservations fair without splitting them.
+TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate) - tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 60)
+if tokens >= 0 then return '0' end
+return tostring(-tokens / rate)
+"""
+
+
+class TokenBucket:
+    """Token bucket for the threads of one process, holding up to one second of tokens by default"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, n):
+        """Take n tokens, returns the seconds the caller must wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate) - n
+            self._updated = now
+            return max(0.0, -self.tokens / self.rate)
+
+
+class RedisTokenBucket:
+    """
+    Token bucket shared across workers through Redis. Falls back to a
+    process-local bucket while Redis is unreachable.
+    """
+
+    RETRY_AFTER = 30  # seconds on the local fallback before trying Redis again
+
+    def __init__(self, client, key, rate, burst=None):
+        self.key = key
+        self.rate = rate
+        self.burst = burst or rate
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+        self._fallback = TokenBucket(rate, burst)
+        self._retry_at = 0.0
+
+    def reserve(self, n):
+        if time.monotonic() >= self._retry_at:
+            try:
+                return float(self._script(keys=[self.key], args=[self.rate, self.burst, n]))
+            except RedisError:
+                self._retry_at = time.monotonic() + self.RETRY_AFTER
+        self._fallback.rate, self._fallback.burst = self.rate, self.burst
+        return self._fallback.reserve(n)
+
+
+def _parse_time(value):
+    hours, minutes = value.split(":")
+    return dtime(int(hours), int(minutes))
+
+
+def window_limits(windows, now):
+    """
+    Limits set by the time-of-day windows covering now, e.g.
+    [{"start": "09:00", "end": "18:00", "global_bytes": 5000000}].
+    A window whose end is before its start runs across midnight.
+    """
+    limits = {}
+    for window in windows:
+        start, end = _parse_time(window["start"]), _parse_time(window["end"])
+        active = start <= now < end if start <= end else now >= start or now < end
+        if active:
+            limits.update({k: v for k, v in window.items() if k not in ("start", "end")})
+    return limits
+
+
+class RateLimiter:
+    """
+    Blocks callers until every configured token bucket has room. limits()
+    returns {name: rate}; names ending in "_bytes" meter bytes per second,
+    "_requests" requests per second, and a rate of 0 means unlimited. Limits
+    are re-read every REFRESH seconds so time-of-day windows take effect
+    during long runs.
+    """
+
+    REFRESH = 60
+    RECENT = 5.0  # seconds a wait keeps the limiter reported as throttling
+
+    def __init__(self, limits, make_bucket):
+        self._limits = limits
+        self._make_bucket = make_bucket
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._refreshed = None
+        self.waits = 0
+        self.waited = 0.0
+        self._last_wait = None
+
+    def _current_buckets(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshed is None or now - self._refreshed >= self.REFRESH:
+                self._refreshed = now
+                buckets = {}
+                for name, rate in self._limits().items():
+                    if not rate:
+                        continue
+                    bucket = self._buckets.get(name)
+                    if bucket is None:
+                        bucket = self._make_bucket(name, rate)
+                    bucket.rate = bucket.burst = rate
+                    buckets[name] = bucket
+                self._buckets = buckets
+            return list(self._buckets.items())
+
+    def acquire(self, nbytes=0, requests=0):
+        """Reserve bytes and requests from every bucket, sleeping as long as the slowest one needs"""
+        wait = 0.0
+        for name, bucket in self._current_buckets():
+            n = nbytes if name.endswith("_bytes") else requests if name.endswith("_requests") else 0
+            if n:
+                wait = max(wait, bucket.reserve(n))
+        if wait:
+            with self._lock:
+                self.waits += 1
+                self.waited += wait
+                self._last_wait = time.monotonic()
+            time.sleep(wait)
+
+    def snapshot(self):
+        """Throttling state for progress reporting"""
+        recent = self._last_wait is not None and time.monotonic() - self._last_wait < self.RECENT
+        return {
+            "rate_limited": recent,
+            "rate_limit_waits": self.waits,
+            "rate_limit_wait": round(self.waited, 1),
+        }
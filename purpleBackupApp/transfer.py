@@ -0,0 +1,453 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from boto3.s3.transfer import ProgressCallbackInvoker, TransferConfig, create_transfer_manager
+from botocore.exceptions import ClientError
+from django.conf import settings
+
+from .throttle import TokenBucket
+
+READ_CHUNK = 1024 * 1024  # bytes read from a ranged GET body at a time
+CANCEL_POLL = 0.5  # seconds between cancel checks while s3transfer runs
+
+KNOWN_DIRS_MAX = 4096  # directories remembered by ensure_dir, least recently used dropped first
+
+# Directories recently created by this process, so makedirs runs once per directory
+_known_dirs = OrderedDict()
+_known_dirs_lock = threading.Lock()
+
+
+def ensure_dir(path, recheck=False):
+    """makedirs path unless it was made recently. recheck skips the cache, for a directory removed since."""
+    with _known_dirs_lock:
+        if not recheck and path in _known_dirs:
+            _known_dirs.move_to_end(path)
+            return
+    os.makedirs(path, exist_ok=True)
+    with _known_dirs_lock:
+        _known_dirs[path] = None
+        _known_dirs.move_to_end(path)
+        if len(_known_dirs) > KNOWN_DIRS_MAX:
+            _known_dirs.popitem(last=False)
+
+
+def in_dir(path, write):
+    """Run write(); if path's directory vanished since ensure_dir cached it, recreate it and retry once"""
+    try:
+        return write()
+    except FileNotFoundError:
+        ensure_dir(os.path.dirname(path), recheck=True)
+        return write()
+
+
+class TransferCancelled(Exception):
+    """The backup was cancelled while an object was being downloaded"""
+
+
+@lru_cache(maxsize=1)
+def transfer_config():
+    """TransferConfig used for objects below the ranged-download threshold"""
+    return TransferConfig(
+        multipart_threshold=settings.BACKUP_PART_SIZE,
+        multipart_chunksize=settings.BACKUP_PART_SIZE,
+        max_concurrency=settings.BACKUP_PART_CONCURRENCY,
+    )
+
+
+def etag_parts(etag):
+    """Part count of a multipart ETag ("<md5>-<n>"), 0 for a single-part upload"""
+    _, sep, count = etag.partition("-")
+    return int(count) if sep and count.isdigit() else 0
+
+
+def combine_part_digests(digests):
+    """Multipart ETag from the raw MD5 digests of the parts, in part order"""
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+class ETagHasher:
+    """
+    Recomputes an S3 ETag from a body fed in order: the plain MD5 of a
+    single-part upload, or md5(part MD5s)-N of a multipart one when
+    part_size is given.
+    """
+
+    def __init__(self, part_size=None):
+        self.part_size = part_size
+        self._md5 = hashlib.md5()
+        self._part_len = 0
+        self._parts = []
+
+    def update(self, data):
+        if not self.part_size:
+            self._md5.update(data)
+            return
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.part_size - self._part_len)
+            self._md5.update(view[:take])
+            self._part_len += take
+            view = view[take:]
+            if self._part_len == self.part_size:
+                self._parts.append(self._md5.digest())
+                self._md5 = hashlib.md5()
+                self._part_len = 0
+
+    def hexdigest(self):
+        if not self.part_size:
+            return self._md5.hexdigest()
+        parts = self._parts + ([self._md5.digest()] if self._part_len or not self._parts else [])
+        return combine_part_digests(parts)
+
+
+def etag_hasher(s3_client, bucket_name, key, etag, size, limiter=None):
+    """
+    ETagHasher able to reproduce an object's ETag, or None when it can't be
+    known. The part size of a multipart upload is read from a HEAD of part 1.
+    Only equal parts (the last one shorter) can be replayed from the body, so
+    an upload whose part count or last part doesn't fit that layout is
+    unverifiable rather than a mismatch.
+    """
+    parts = etag_parts(etag)
+    if not parts:
+        return ETagHasher()
+    if parts == 1:
+        return ETagHasher(max(size, 1))
+
+    def _part_length(number):
+        if limiter:
+            limiter.acquire(requests=1)
+        resp = s3_client.head_object(Bucket=bucket_name, Key=key, PartNumber=number, IfMatch=f'"{etag}"')
+        return resp["ContentLength"]
+
+    try:
+        part_size = _part_length(1)
+        if not part_size or -(-size // part_size) != parts:
+            return None
+        if _part_length(parts) != size - (parts - 1) * part_size:
+            return None
+    except ClientError:
+        return None
+    return ETagHasher(part_size)
+
+
+def file_etag(path, part_size=None, rate=0):
+    """
+    ETag of a local file, read through mmap without copying. rate caps the
+    bytes/s this call reads, 0 = unlimited.
+    """
+    hasher = ETagHasher(part_size)
+    bucket = TokenBucket(rate, max(rate, READ_CHUNK)) if rate else None
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, len(mm), READ_CHUNK):
+                        chunk = view[offset:offset + READ_CHUNK]
+                        if bucket:
+                            time.sleep(bucket.reserve(len(chunk)))
+                        hasher.update(chunk)
+                        chunk.release()
+                finally:
+                    view.release()
+    return hasher.hexdigest()
+
+
+class _HashingWriter:
+    """Write-only file wrapper feeding digests. Without seek, s3transfer writes it strictly in order."""
+
+    def __init__(self, f, *digests):
+        self._f = f
+        self._digests = [d for d in digests if d is not None]
+
+    def write(self, data):
+        for digest in self._digests:
+            digest.update(data)
+        return self._f.write(data)
+
+
+class _OrderedDigest:
+    """
+    Feeds concurrently written ranges into digests in file order, from the
+    bytes the writers hold. A chunk ahead of the hashed prefix is kept until
+    the prefix reaches it; past HASH_BUFFER bytes held, its writer waits
+    instead. Ranges left on disk by an earlier run are read back when the
+    prefix reaches them, nothing else is.
+    """
+
+    def __init__(self, digests, fd, part_size, on_disk):
+        self._digests = digests
+        self._fd = fd
+        self._part_size = part_size
+        self._on_disk = on_disk  # part numbers already written before this run
+        self._cond = threading.Condition()
+        self._offset = 0  # bytes fed so far
+        self._held = {}   # offset: chunk, waiting for the prefix
+        self._held_bytes = 0
+        self._aborted = False
+        with self._cond:
+            self._drain()
+
+    def feed(self, offset, chunk, cancelled=None):
+        with self._cond:
+            # The writer at the prefix never waits, so the prefix always advances
+            while offset != self._offset and self._held_bytes and \
+                    self._held_bytes + len(chunk) > settings.BACKUP_HASH_BUFFER:
+                if self._aborted or (cancelled is not None and cancelled.is_set()):
+                    raise TransferCancelled()
+                self._cond.wait(CANCEL_POLL)
+            if offset == self._offset:
+                self._update(chunk)
+                self._drain()
+            else:
+                self._held[offset] = chunk
+                self._held_bytes += len(chunk)
+
+    def abort(self):
+        """Wake waiting writers after a failed range, its bytes will never come"""
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+
+    def finish(self, size):
+        if self._offset != size:
+            raise IOError(f"Hashed {self._offset} of {size} bytes")
+
+    def _update(self, chunk):
+        for digest in self._digests:
+            digest.update(chunk)
+        self._offset += len(chunk)
+
+    def _drain(self):
+        while True:
+            chunk = self._held.pop(self._offset, None)
+            if chunk is not None:
+                self._held_bytes -= len(chunk)
+                self._update(chunk)
+            elif self._offset % self._part_size == 0 and self._offset // self._part_size in self._on_disk:
+                self._read_back(self._offset + self._part_size)
+            else:
+                break
+        self._cond.notify_all()
+
+    def _read_back(self, end):
+        end = min(end, os.fstat(self._fd).st_size)
+        while self._offset < end:
+            chunk = os.pread(self._fd, min(READ_CHUNK, end - self._offset), self._offset)
+            if not chunk:
+                raise IOError(f"Short read at {self._offset} while hashing")
+            self._update(chunk)
+
+
+def _load_done_parts(state_path, header):
+    """{part number: MD5 hex} of parts already on disk from an interrupted run of the same object version"""
+    try:
+        with open(state_path) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return {}
+    if not lines or json.loads(lines[0]) != header:
+        return {}
+    # A torn last line means the crash hit mid-append, that part is simply redone
+    done = {}
+    for line in lines[1:]:
+        number, _, digest = line.partition(" ")
+        if number.isdigit() and len(digest) == 32:
+            done[int(number)] = digest
+    return done
+
+
+def _preallocate(fd, size):
+    if os.fstat(fd).st_size == size or not size:
+        return
+    os.ftruncate(fd, size)
+    if hasattr(os, "posix_fallocate"):
+        os.posix_fallocate(fd, 0, size)
+
+
+def _fetch_part(s3_client, bucket_name, key, etag, fd, start, end, limiter=None, cancelled=None, ordered=None):
+    if cancelled is not None and cancelled.is_set():
+        raise TransferCancelled(key)
+    if limiter:
+        limiter.acquire(requests=1)
+    resp = s3_client.get_object(
+        Bucket=bucket_name,
+        Key=key,
+        Range=f"bytes={start}-{end}",
+        IfMatch=f'"{etag}"',
+    )
+    body = resp["Body"]
+    md5 = hashlib.md5()
+    offset = start
+    for chunk in iter(lambda: body.read(READ_CHUNK), b""):
+        if cancelled is not None and cancelled.is_set():
+            body.close()
+            raise TransferCancelled(key)
+        if limiter:
+            limiter.acquire(nbytes=len(chunk))
+        os.pwrite(fd, chunk, offset)
+        md5.update(chunk)
+        if ordered is not None:
+            ordered.feed(offset, chunk, cancelled)
+        offset += len(chunk)
+    if offset != end + 1:
+        raise IOError(f"Short read for {key} bytes {start}-{end}: got {offset - start} bytes")
+    return md5.hexdigest()
+
+
+def download_ranged(s3_client, bucket_name, key, size, etag, local_path,
+                    part_size=None, concurrency=None, limiter=None, hasher=None, content=None,
+                    cancelled=None):
+    """
+    Download one object as concurrent byte ranges into a preallocated
+    <local_path>.part file. Finished parts and their MD5s are logged to
+    <local_path>.part.state so a crashed run only refetches the missing ranges.
+
+    Returns the recomputed ETag, or None without a hasher. A multipart
+    hasher sets the range size to the upload's part size, so every range
+    MD5 is a part MD5. A single-part ETag is an MD5 over the whole body, fed
+    in file order from the downloaded chunks like the optional content
+    digest (a hashlib object, e.g. the SHA256 for the content store).
+
+    Once cancelled is set, queued ranges are dropped and TransferCancelled is
+    raised. The .part and .part.state files stay, so the next run resumes.
+    """
+    multipart = hasher is not None and hasher.part_size
+    if multipart:
+        part_size = hasher.part_size
+    part_size = part_size or settings.BACKUP_PART_SIZE
+    concurrency = concurrency or settings.BACKUP_PART_CONCURRENCY
+    part_path = local_path + ".part"
+    state_path = local_path + ".part.state"
+    header = {"etag": etag, "size": size, "part_size": part_size}
+
+    done = _load_done_parts(state_path, header)
+    if not done:
+        with open(state_path, "w") as f:
+            f.write(json.dumps(header) + "\n")
+
+    part_count = max(1, -(-size // part_size))
+    todo = [n for n in range(part_count) if n not in done]
+    md5 = hashlib.md5() if hasher is not None and not multipart else None
+    digests = [d for d in (md5, content) if d is not None]
+
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _preallocate(fd, size)
+        ordered = _OrderedDigest(digests, fd, part_size, set(done)) if digests else None
+        with open(state_path, "a") as state, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(
+                    _fetch_part, s3_client, bucket_name, key, etag, fd,
+                    n * part_size, min(size, (n + 1) * part_size) - 1, limiter, cancelled, ordered,
+                ): n
+                for n in todo
+            }
+            try:
+                for future in as_completed(futures):
+                    if cancelled is not None and cancelled.is_set():
+                        raise TransferCancelled(key)
+                    n = futures[future]
+                    done[n] = future.result()
+                    state.write(f"{n} {done[n]}\n")
+                    state.flush()
+            except BaseException:
+                # Drop queued ranges and release writers waiting on the hashed prefix
+                for pending in futures:
+                    pending.cancel()
+                if ordered is not None:
+                    ordered.abort()
+                raise
+        if ordered is not None:
+            ordered.finish(size)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    os.replace(part_path, local_path)
+    os.remove(state_path)
+    if multipart:
+        return combine_part_digests([bytes.fromhex(done[n]) for n in range(part_count)])
+    return md5.hexdigest() if md5 is not None else None
+
+
+def download_small(s3_client, bucket_name, key, local_path, size=0, limiter=None, hasher=None, content=None):
+    """Plain GET into memory and a single write, no temp file or s3transfer setup"""
+    if limiter:
+        limiter.acquire(nbytes=size, requests=1)
+    data = s3_client.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+    for digest in (hasher, content):
+        if digest is not None:
+            digest.update(data)
+    # Replace rather than truncate, the old file may be a hard link into the content store
+    try:
+        os.remove(local_path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _download_transfer(s3_client, bucket_name, key, f, callback=None, cancelled=None):
+    """download_fileobj through our own TransferManager, so the transfer future can be cancelled mid-object"""
+    subscribers = [ProgressCallbackInvoker(callback)] if callback else None
+    with create_transfer_manager(s3_client, transfer_config()) as manager:
+        future = manager.download(bucket_name, key, f, subscribers=subscribers)
+        while cancelled is not None and not future.done():
+            if cancelled.wait(CANCEL_POLL):
+                future.cancel()
+                raise TransferCancelled(key)
+        future.result()
+
+
+def download_object(s3_client, bucket_name, obj, local_path, limiter=None, cancelled=None):
+    """
+    Route an object to the small, ranged or s3transfer path by size, metered
+    by an optional RateLimiter. The ETag, and with the content store the
+    SHA256, are computed while the body streams to disk. Returns (local ETag,
+    part size it was computed with, SHA256); the ETag is None when the
+    multipart part size can't be found. Raises TransferCancelled once the
+    cancelled Event is set between parts.
+    """
+    size = obj["Size"]
+    etag = obj.get("ETag", "").strip('"')
+    hasher = etag_hasher(s3_client, bucket_name, obj["Key"], etag, size, limiter)
+    content = hashlib.sha256() if settings.BACKUP_CONTENT_STORE else None
+    if size <= settings.BACKUP_SMALL_OBJECT_THRESHOLD:
+        download_small(s3_client, bucket_name, obj["Key"], local_path, size, limiter, hasher, content)
+        local_etag = hasher.hexdigest() if hasher else None
+    elif size >= min(settings.BACKUP_LARGE_OBJECT_THRESHOLD, settings.BACKUP_PART_SIZE):
+        # s3transfer only writes in order below its multipart threshold, bigger
+        # bodies would sit in memory until their turn to be hashed
+        local_etag = download_ranged(
+            s3_client, bucket_name, obj["Key"], size, etag, local_path,
+            limiter=limiter, hasher=hasher, content=content, cancelled=cancelled,
+        )
+    else:
+        callback = None
+        if limiter:
+            # s3transfer reports bytes as they arrive, blocking here paces its IO threads
+            limiter.acquire(requests=1)
+            callback = lambda nbytes: limiter.acquire(nbytes=nbytes)
+        part_path = local_path + ".part"
+        with open(part_path, "wb") as f:
+            _download_transfer(
+                s3_client, bucket_name, obj["Key"], _HashingWriter(f, hasher, content), callback, cancelled,
+            )
+        os.replace(part_path, local_path)
+        local_etag = hasher.hexdigest() if hasher else None
+    sha256 = content.hexdigest() if content is not None else None
+    return local_etag, hasher.part_size if hasher else None, sha256
@@ -12,10 +12,15 @@ urlpatterns = [
     
     # Existing routes
     path("bucket/<int:bucket_id>/", views.bucket_detail, name="bucket_detail"),
+    path("bucket/<int:bucket_id>/files.json", views.bucket_detail_api, name="bucket_detail_api"),
+    path("bucket/<int:bucket_id>/archive/", views.folder_archive, name="folder_archive"),
     path("backup/<int:bucket_id>/", views.trigger_backup, name="trigger_backup"),
     path("backup/all/", views.trigger_backup_all, name="trigger_backup_all"),  # JSON view
     path("backup/status/<str:task_id>/", views.backup_status, name="backup_status"),
+    path("backup/progress/", views.backup_progress, name="backup_progress_all"),
+    path("backup/progress/<int:bucket_id>/", views.backup_progress, name="backup_progress"),
     path("search/", views.search_files, name="search_files"),
+    path("search.json", views.search_files_api, name="search_files_api"),
     path("file/<int:file_id>/", views.serve_file, name="serve_file"),
     path("bucket/<int:bucket_id>/stop-backup/", views.stop_backup, name="stop_backup"),
     # urls.py
@@ -1,16 +1,24 @@
 from django.shortcuts import render, get_object_or_404
 from django.db.models import Sum, Q
-from django.http import HttpResponseRedirect, JsonResponse, Http404, FileResponse
+from django.http import HttpResponseRedirect, JsonResponse, Http404, StreamingHttpResponse
 from django.urls import reverse
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models.functions import Length, Replace
 from django.conf import settings
+from django.core.cache import cache
 import os
+import json
+import base64
 from urllib.parse import quote
-
-from .models import WasabiBucket, FileBackup
-from .tasks import trigger_incremental_backup, backup_all_buckets
+from django.utils.http import content_disposition_header
+
+from .models import WasabiBucket, FileBackup, BackupFolder
+from . import search as search_index
+from . import progress
+from . import serving
+from . import archive
+from .tasks import start_backup, backup_all_buckets, cancel_key, CANCEL_TTL
 from celery.result import AsyncResult
 from backupProject.celery import app  # your Celery app
 import humanize  # for human-readable sizes
@@ -20,8 +28,9 @@ def dashboard(request):
     
     buckets = WasabiBucket.objects.all()
     total_buckets = buckets.count()
-    total_files = FileBackup.objects.count()
-    total_size = FileBackup.objects.aggregate(total=Sum('size'))['total'] or 0
+    totals = buckets.aggregate(files=Sum('total_files'), size=Sum('total_size'))
+    total_files = totals['files'] or 0
+    total_size = totals['size'] or 0
     total_size_hr = humanize.naturalsize(total_size)
     last_backup_time = buckets.order_by('-last_backup_at').first().last_backup_at if buckets.exists() else None
 
@@ -40,8 +49,9 @@ def buckets(request):
     """Buckets view showing all buckets with backup functionality"""
     buckets = WasabiBucket.objects.all()
     total_buckets = buckets.count()
-    total_files = FileBackup.objects.count()
-    total_size = FileBackup.objects.aggregate(total=Sum('size'))['total'] or 0
+    totals = buckets.aggregate(files=Sum('total_files'), size=Sum('total_size'))
+    total_files = totals['files'] or 0
+    total_size = totals['size'] or 0
     total_size_hr = humanize.naturalsize(total_size)
 
     context = {
@@ -63,6 +73,9 @@ from django.shortcuts import get_object_or_404, render
 from django.db.models import Sum
 from .models import WasabiBucket, FileBackup
 
+FOLDER_PAGE_SIZE = 200  # folders + files per bucket_detail page
+SEARCH_PAGE_SIZE = 50   # results per search page
+
 def format_bytes(size):
     
     for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -72,39 +85,113 @@ def format_bytes(size):
     return f"{size:.2f} PB"
 
 
+def _encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode() if cursor else None
+
+
+def _decode_cursor(value, valid):
+    """Opaque ?after= value back to a cursor, None (the first page) for a missing, mangled or wrong-shaped one"""
+    if not value:
+        return None
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except ValueError:
+        return None
+    return cursor if valid(cursor) else None
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_position(value):
+    """[value, id] as written by _keyset callers"""
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and _is_int(value[1])
+
+
+def _is_folder_cursor(cursor):
+    return (
+        isinstance(cursor, list) and len(cursor) == 2 and cursor[0] in ('d', 'f')
+        and (cursor[1] is None or _is_position(cursor[1]))
+    )
+
+
+def _is_search_cursor(cursor):
+    return (
+        isinstance(cursor, list) and len(cursor) == 3
+        and _is_int(cursor[0]) and isinstance(cursor[1], str) and _is_int(cursor[2])
+    )
+
+
+def _keyset(queryset, field, position, limit):
+    """Up to limit rows ordered by (field, id), strictly after position = [value, id]"""
+    queryset = queryset.order_by(field, 'id')
+    if position:
+        value, last_id = position
+        queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': last_id}))
+    return list(queryset[:limit])
+
+
+def _folder_page(bucket, current_folder, cursor):
+    """
+    One page of a folder listing: child folders first, then the files directly
+    in it. Returns (folders, files, next_cursor); the cursor records which of
+    the two lists to continue and where.
+    """
+    folder_hash = BackupFolder.hash_path(current_folder)
+    phase, position = cursor if cursor else ('d', None)
+
+    folders = []
+    if phase == 'd':
+        folders = _keyset(
+            BackupFolder.objects.filter(bucket=bucket, parent_hash=folder_hash, total_files__gt=0),
+            'name', position, FOLDER_PAGE_SIZE + 1,
+        )
+        if len(folders) > FOLDER_PAGE_SIZE:
+            folders = folders[:FOLDER_PAGE_SIZE]
+            return folders, [], ['d', [folders[-1].name, folders[-1].id]]
+        position = None
+
+    limit = FOLDER_PAGE_SIZE - len(folders)
+    files = bucket.files.filter(folder_hash=folder_hash).exclude(status='deleted')
+    files = _keyset(files, 'basename', position, limit + 1)
+    if len(files) <= limit:
+        return folders, files, None
+    files = files[:limit]
+    return folders, files, ['f', [files[-1].basename, files[-1].id] if files else None]
+
+
+def _file_json(f):
+    return {
+        'id': f.id,
+        'key': f.wasabi_key,
+        'name': f.filename,
+        'size': f.size,
+        'bucket': f.bucket.name,
+        'url': reverse('serve_file', args=[f.id]),
+    }
+
+
 def bucket_detail(request, bucket_id):
     bucket = get_object_or_404(WasabiBucket, id=bucket_id)
     current_folder = request.GET.get('folder', '').strip('/')
 
-    # All files under the current folder recursively
-    if current_folder:
-        files_in_folder = bucket.files.filter(wasabi_key__startswith=current_folder + '/')
-    else:
-        files_in_folder = bucket.files.all()
-
-    # Compute stats for the folder recursively
-    total_objects = files_in_folder.count()
-    total_data = files_in_folder.aggregate(total_size=Sum('size'))['total_size'] or 0
+    # Folder stats are maintained by the backup runs
+    folder = BackupFolder.for_path(bucket, current_folder)
+    total_objects = folder.total_files if folder else 0
+    total_data = folder.total_size if folder else 0
     total_data_hr = format_bytes(total_data)
 
-    # Determine immediate subfolders (next level only)
-    subfolders = set()
-    immediate_files = []
-    for f in files_in_folder:
-        parts = f.wasabi_key.split('/')
-        if current_folder:
-            rel_parts = parts[len(current_folder.split('/')):]
-        else:
-            rel_parts = parts
-        if len(rel_parts) > 1:
-            subfolders.add(rel_parts[0])
-        else:
-            immediate_files.append(f) 
+    # One keyset page of the folder index, the template fetches the rest lazily
+    folders, files, next_cursor = _folder_page(
+        bucket, current_folder, _decode_cursor(request.GET.get('after'), _is_folder_cursor)
+    )
 
     context = {
         'bucket': bucket,
-        'files_qs': immediate_files,  
-        'subfolders': sorted(subfolders),
+        'files_qs': files,
+        'subfolders': [f.name for f in folders],
+        'next_cursor': _encode_cursor(next_cursor),
         'current_folder': current_folder,
         'total_objects': total_objects,
         'total_data': total_data,
@@ -114,11 +201,80 @@ def bucket_detail(request, bucket_id):
     return render(request, 'purpleBackupApp/bucket_detail.html', context)
 
 
+def bucket_detail_api(request, bucket_id):
+    """JSON page of a folder listing for lazy loading"""
+    bucket = get_object_or_404(WasabiBucket, id=bucket_id)
+    current_folder = request.GET.get('folder', '').strip('/')
+    folders, files, next_cursor = _folder_page(
+        bucket, current_folder, _decode_cursor(request.GET.get('after'), _is_folder_cursor)
+    )
+    return JsonResponse({
+        'folders': [
+            {'name': f.name, 'path': f.path, 'url': f"{reverse('bucket_detail', args=[bucket.id])}?folder={quote(f.path)}"}
+            for f in folders
+        ],
+        'files': [_file_json(f) for f in files],
+        'next': _encode_cursor(next_cursor),
+    })
+
+
+ARCHIVE_FORMATS = {'zip': 'application/zip', 'tar': 'application/x-tar'}
+ARCHIVE_CHUNK = 1000  # rows fetched per query while an archive streams
+
+
+def _archive_entries(files, strip):
+    """
+    ArchiveEntry per synced file, read in keyset chunks over wasabi_key so
+    memory stays flat. Failed and pending rows have no complete local copy
+    and are left out.
+    """
+    files = files.filter(status='synced').order_by('wasabi_key')
+    after = None
+    while True:
+        chunk = files.filter(wasabi_key__gt=after) if after is not None else files
+        chunk = list(chunk.values_list('wasabi_key', 'local_path', 'last_modified')[:ARCHIVE_CHUNK])
+        for key, local_path, last_modified in chunk:
+            name = archive.safe_name(key[strip:])
+            if name and not key.endswith('/'):
+                yield archive.ArchiveEntry(name, local_path, last_modified.timestamp())
+        if len(chunk) < ARCHIVE_CHUNK:
+            return
+        after = chunk[-1][0]
+
+
+def folder_archive(request, bucket_id):
+    """Stream a folder, or the whole bucket, as a zip or tar archive built on the fly"""
+    bucket = get_object_or_404(WasabiBucket, id=bucket_id)
+    current_folder = request.GET.get('folder', '').strip('/')
+    fmt = request.GET.get('format', 'zip')
+    if fmt not in ARCHIVE_FORMATS:
+        raise Http404("Unknown archive format.")
+
+    files = bucket.files.all()
+    if current_folder:
+        files = files.filter(wasabi_key__startswith=current_folder + '/')
+    entries = _archive_entries(files, len(current_folder) + 1 if current_folder else 0)
+
+    stream = archive.stream_zip if fmt == 'zip' else archive.stream_tar
+    response = StreamingHttpResponse(
+        stream(entries, settings.BACKUP_ARCHIVE_READAHEAD), content_type=ARCHIVE_FORMATS[fmt]
+    )
+    name = current_folder.rpartition('/')[2] or bucket.name
+    response['Content-Disposition'] = content_disposition_header(True, f"{name}.{fmt}")
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass the archive through as it is produced
+    return response
+
+
 def trigger_backup(request, bucket_id=None):
     if request.method == "POST":
         if bucket_id:
             bucket = get_object_or_404(WasabiBucket, id=bucket_id)
-            result = trigger_incremental_backup.delay(bucket.id)
+            result = start_backup(bucket.id)
+            if result is None:
+                if request.headers.get("x-requested-with") == "XMLHttpRequest":
+                    return JsonResponse({"error": f"A backup of {bucket.name} is already running"}, status=409)
+                messages.warning(request, f"A backup of {bucket.name} is already running")
+                return HttpResponseRedirect(reverse('buckets'))
             if request.headers.get("x-requested-with") == "XMLHttpRequest":
                 return JsonResponse({"task_id": result.id})
             messages.success(request, f"Backup triggered for {bucket.name} (task id: {result.id})")
@@ -140,6 +296,17 @@ def trigger_backup_all(request):
     return JsonResponse({"error": "Invalid request"}, status=400)
 
 
+async def backup_progress(request, bucket_id=None):
+    """
+    Server-Sent Events stream of backup progress, for one bucket or all of them.
+    Under WSGI Django buffers an async stream until it ends, so serve this from ASGI.
+    """
+    response = StreamingHttpResponse(progress.stream(bucket_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx must not buffer the stream
+    return response
+
+
 def backup_status(request, task_id):
     """Check backup task status"""
     try:
@@ -152,34 +319,72 @@ def backup_status(request, task_id):
         return JsonResponse({'status': 'ERROR', 'error': str(e)})
 
 
-def search_files(request):
-    """Search files across buckets"""
+def _search_queryset(request):
     query = request.GET.get('q')
     bucket_id = request.GET.get('bucket_id')
-    files = FileBackup.objects.none()
-    if query:
-        files = FileBackup.objects.filter(
-            Q(wasabi_key__icontains=query) |
-            Q(bucket__name__icontains=query)
+    files = search_index.search_files(
+        query,
+        bucket_id=bucket_id,
+        match=request.GET.get('match'),
+        ext=request.GET.get('ext'),
+    )
+    return files.select_related('bucket'), query, bucket_id
+
+
+def _search_page(files, cursor):
+    """One page ordered by (rank desc, wasabi_key, id), strictly after cursor = [rank, key, id]"""
+    files = files.order_by('-rank', 'wasabi_key', 'id')
+    if cursor:
+        rank, key, last_id = cursor
+        files = files.filter(
+            Q(rank__lt=rank)
+            | Q(rank=rank, wasabi_key__gt=key)
+            | Q(rank=rank, wasabi_key=key, id__gt=last_id)
         )
-        if bucket_id:
-            files = files.filter(bucket_id=bucket_id)
+    files = list(files[:SEARCH_PAGE_SIZE + 1])
+    if len(files) <= SEARCH_PAGE_SIZE:
+        return files, None
+    files = files[:SEARCH_PAGE_SIZE]
+    last = files[-1]
+    return files, [last.rank, last.wasabi_key, last.id]
+
+
+def search_files(request):
+    """Search files across buckets"""
+    files, query, bucket_id = _search_queryset(request)
+    files, next_cursor = _search_page(files, _decode_cursor(request.GET.get('after'), _is_search_cursor))
     return render(request, "purpleBackupApp/search_results.html", {
         "files": files,
+        "next_cursor": _encode_cursor(next_cursor),
         "query": query,
         "bucket_id": bucket_id
     })
 
 
+def search_files_api(request):
+    """JSON page of search results for lazy loading"""
+    files, query, bucket_id = _search_queryset(request)
+    files, next_cursor = _search_page(files, _decode_cursor(request.GET.get('after'), _is_search_cursor))
+    return JsonResponse({
+        'files': [_file_json(f) for f in files],
+        'next': _encode_cursor(next_cursor),
+    })
+
+
 def serve_file(request, file_id):
-    """Serve a file from local_path stored in FileBackup"""
-    try:
-        f = FileBackup.objects.get(id=file_id)
-        if not os.path.exists(f.local_path):
-            raise Http404("File not found on server.")
-        return FileResponse(open(f.local_path, 'rb'), as_attachment=False)
-    except FileBackup.DoesNotExist:
+    """Serve a file from local_path stored in FileBackup, with Range, conditional requests and proxy offload"""
+    f = (
+        FileBackup.objects.filter(id=file_id)
+        .only('wasabi_key', 'local_path', 'etag', 'last_modified', 'status')
+        .first()
+    )
+    if f is None:
         raise Http404("File not found.")
+    if not os.path.exists(f.local_path):
+        raise Http404("File not found on server.")
+    # Only a synced copy is known to hold the bytes the stored ETag names
+    etag = f.etag if f.status == 'synced' else None
+    return serving.file_response(request, f.local_path, f.filename, etag=etag, last_modified=f.last_modified)
 
 
 def build_hierarchy(files):
@@ -209,6 +414,9 @@ def build_hierarchy(files):
 
 @csrf_exempt
 def stop_backup(request, bucket_id):
+    """Flag the bucket's running backup to stop; it saves finished work and the next backup resumes it"""
     if request.method == "POST":
+        bucket = get_object_or_404(WasabiBucket, id=bucket_id)
+        cache.set(cancel_key(bucket.id), True, timeout=CANCEL_TTL)
         return JsonResponse({"status": f"Stop backup requested for bucket {bucket_id}"})
     return JsonResponse({"error": "Invalid request"}, status=400)  
\ No newline at end of file